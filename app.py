@@ -1,12 +1,18 @@
 # app.py
-import concurrent.futures
+import hashlib
+import os
 import streamlit as st
-import pandas as pd
 import plotly.graph_objects as go
 from streamlit_autorefresh import st_autorefresh  # pip install streamlit-autorefresh
 from streamlit import components  # client side plotly animation
-from functions import insert_highlights, _worker  # (text, spans_with_skills) -> HTML
-from data import data_df, persons
+from rendering import (insert_highlights, build_skill_table, pack_html, unpack_html,  # (text, spans_with_skills) -> HTML
+                       _highlight_spans)
+from functions import _warmup_messages, _worker, _explanation_worker, backend
+from data import DATA_DIR, DATA_CONVERTERS, DEFAULT_GOAL, DEFAULT_INTERESTS, persons
+from dataset_manager import DatasetManager, activity_id
+from jobs import IdleQueue, JobRegistry, ResultStore, process_gauge
+from similarity import ActivityIndex
+from prerender import load_artifacts, row_hash
 
 # ---- Streamlit Setup ----
 st.set_page_config(page_title="ESCO Dashboard", layout="wide")
@@ -103,6 +109,19 @@ st.markdown("""
 .es-acc>summary::after{ content:"▸"; font-size:.9em; transform:translateY(1px); margin-left:4px; }
 .es-acc[open]>summary::after{ content:"▾"; }
 
+/* Deduplizierte Highlights: eine gemeinsame Karte, Einträge je Segment per generierter Regel;
+   Klick auf ein Segment pinnt seine Einträge (verstecktes Radio), damit die Karte bedienbar bleibt */
+.es-hl{ position:relative; }
+.es-ref{ padding:0 .14em; border-radius:4px; cursor:pointer; }
+.es-pin{ position:absolute; opacity:0; width:0; height:0; margin:0; pointer-events:none; }
+.es-ref:has(.es-pin:focus-visible){ outline:2px solid #2563eb; outline-offset:2px; }
+.es-ref:has(.es-pin:checked){ box-shadow:inset 0 -2px 0 #2563eb; }
+.es-pool{ inset:100% auto auto 0; }
+.es-pool .es-item{ display:none; }
+.es-hl:has(.es-ref:hover,.es-ref:focus-within) .es-pool,
+.es-pool:hover,
+.es-pool:focus-within{ visibility:visible; opacity:1; translate:0 0; }
+
 /* Inhalt des Accordions */
 .es-reason{
   margin-top:8px; padding:8px 10px;
@@ -114,14 +133,48 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ---- State ----
-DEFAULT_GOAL = "I want to go outside more often"
-DEFAULT_INTERESTS = "Computer Games, Cinema, Pets"
 
+@st.cache_resource
+def _dataset_manager():
+    # one watcher per process; ingests new/appended files in data/ in the background
+    manager = DatasetManager(DATA_DIR, converters=DATA_CONVERTERS,
+                             interval=float(os.environ.get("DATASET_POLL_INTERVAL", 5)))
+    manager.start()
+    return manager
+
+
+# dataset version of this session; stays fixed until the user loads a newer one
+if "dataset" not in st.session_state: st.session_state.dataset = _dataset_manager().snapshot()
 if "task_idx" not in st.session_state: st.session_state.task_idx = 0
-if "executor" not in st.session_state: st.session_state.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-if "futures" not in st.session_state: st.session_state.futures = {}      # {job_key: Future}
-if "poll_counts" not in st.session_state: st.session_state.poll_counts = {}  # {job_key: int}
-if "last_score" not in st.session_state: st.session_state.last_score = {}  # {job_key: float 0..100}
+
+@st.cache_resource
+def _llm_backend():
+    # one lifecycle thread per process: model check, warm-up with the prompt prefix, keep-alive
+    backend.set_warmup_messages(_warmup_messages(persons, DEFAULT_GOAL, DEFAULT_INTERESTS))
+    backend.start()
+    return backend
+
+
+@st.cache_resource
+def _result_store():
+    # finished results shared by all sessions of this process
+    return ResultStore(max_items=int(os.environ.get("RESULT_STORE_SIZE", 10000)))
+
+
+@st.cache_resource
+def _idle_queue():
+    # explanations prefetched while no session waits for a score
+    return IdleQueue(_result_store())
+
+
+# two-phase mode: score + short explanation first, long explanation on demand or prefetched
+TWO_PHASE = os.environ.get("LLM_TWO_PHASE", "1") == "1"
+PREFETCH_EXPLANATION = os.environ.get("LLM_PREFETCH_EXPLANATION", "1") == "1"
+
+# futures, poll counts and last scores of this session; executor is shut down with the session
+if "jobs" not in st.session_state:
+    st.session_state.jobs = JobRegistry(max_jobs=int(os.environ.get("JOB_REGISTRY_SIZE", 64)),
+                                        result_store=_result_store())
 
 # setting per person
 if "goals" not in st.session_state:
@@ -129,11 +182,23 @@ if "goals" not in st.session_state:
 if "interests" not in st.session_state:
     st.session_state.interests = {i: DEFAULT_INTERESTS for i in range(len(persons))}
 
+data_df = st.session_state.dataset.df
 NUM_TASKS = len(data_df)
 
 # Headline
 st.title("ESCO Dashboard")
 
+_latest = _dataset_manager().snapshot()
+if _latest.version != st.session_state.dataset.version:
+    upd_col1, upd_col2 = st.columns([4, 1], vertical_alignment="center")
+    with upd_col1:
+        st.info(f"New dataset version available: {len(_latest)} activities (currently {NUM_TASKS}).")
+    with upd_col2:
+        if st.button("Load new data", key="load_dataset", use_container_width=True):
+            st.session_state.dataset = _latest
+            st.session_state.task_idx = min(st.session_state.task_idx, len(_latest) - 1)
+            st.rerun()
+
 # ---- Person-Settings ----
 st.markdown("#### Person-Settings")
 ps_col1, ps_col2, ps_col3, ps_col4 = st.columns([1,2,2,0.5], vertical_alignment="bottom")
@@ -158,10 +223,11 @@ with ps_col4:
         st.session_state.goals[person_idx] = ui_goal
         st.session_state.interests[person_idx] = ui_interests
         # Recompute erzwingen
-        st.session_state.futures = {}
+        st.session_state.jobs.clear()
         st.rerun()
 
 row = data_df.iloc[st.session_state.task_idx]
+row_key = row_hash(row)  # identifies the row content across dataset versions
 
 # ---- Activity-Text + Spans ----
 st.markdown("#### Activity Text")
@@ -178,9 +244,28 @@ with col3:
         st.session_state.task_idx += 1
         st.rerun()
 
+# each tooltip entry once per text in a shared card below it, see insert_highlights(dedupe=True)
+HIGHLIGHT_DEDUPE = os.environ.get("HIGHLIGHT_DEDUPE", "0") == "1"
+
+
+@st.cache_resource
+def _artifacts():
+    # pre-rendered HTML from prerender.py; new or changed rows are rendered on demand
+    return load_artifacts()
+
+
+@st.cache_data(max_entries=2000)
+def _highlight_payload(rh, _r):
+    # compressed, so cached payloads of many rows stay small
+    packed = _artifacts().highlight_packed(rh, HIGHLIGHT_DEDUPE)
+    if packed is not None:
+        return packed
+    r = _r
+    return pack_html(insert_highlights(r["X"], _highlight_spans(r.get("y_pred_detailed")), dedupe=HIGHLIGHT_DEDUPE))
+
+
 detailed = row.get("y_pred_detailed") or []
-spans = [d for d in detailed if isinstance(d, dict) and d.get("span") and (d.get("needed") or d.get("optional") or d.get("trainable"))]
-text_html = insert_highlights(row["X"], spans)
+text_html = unpack_html(_highlight_payload(row_key, row))
 st.markdown(f"""
 <div style="position:relative; overflow:visible;
             border:1px solid #e2e8f0; border-radius:10px;
@@ -196,28 +281,39 @@ st.markdown("---")
 pskills = persons[person_idx]
 goal_text = st.session_state.goals.get(person_idx, DEFAULT_GOAL)
 interests_text = st.session_state.interests.get(person_idx, DEFAULT_INTERESTS)
-job_key = f"{st.session_state.task_idx}:{person_idx}"
-
-if job_key not in st.session_state.futures:
-    st.session_state.futures[job_key] = st.session_state.executor.submit(
-        _worker, row["X"], detailed, pskills, goal_text, interests_text, person_idx
+# goal/interests are part of the key because finished results are shared across sessions
+_settings_hash = hashlib.sha1(f"{goal_text}\n{interests_text}".encode("utf-8")).hexdigest()[:10]
+job_key = f"{row_key[:12]}:{person_idx}:{_settings_hash}"
+
+# known or cached jobs are always shown; new ones only start once the model is ready
+fut = st.session_state.jobs.get(job_key)
+if fut is None and _llm_backend().ready:
+    fut = st.session_state.jobs.submit(
+        job_key, _worker, row["X"], detailed, pskills, goal_text, interests_text, person_idx, not TWO_PHASE
     )
-    st.session_state.poll_counts[job_key] = 0
-
-fut = st.session_state.futures[job_key]
-if not fut.done():
-    st_autorefresh(interval=1000, key=f"poll_{job_key}", limit=30)
+if fut is None:
+    st_autorefresh(interval=2000, key=f"backend_{job_key}")
+elif not fut.done():
+    # no refresh limit: jobs end within LLM_DEADLINE once started, and the refresh is no longer
+    # rendered as soon as the future is done
+    st_autorefresh(interval=1000, key=f"poll_{job_key}")
 
 # result
 res = {"score": 0.0, "expl": "Calculating...", "expl_short": ""}
-if fut.done():
+scored = False  # finished with a real score
+if fut is not None and fut.done():
     try:
         res = fut.result()
     except Exception as e:
-        res = {"score": 0.0, "expl": f"Fehler: {type(e).__name__}", "expl_short": ""}
+        res = {"score": 0.0, "expl": f"Fehler: {type(e).__name__}", "expl_short": "", "failed": True}
+    if res.get("failed"):
+        # do not cache failures -> the next rerun submits the job again
+        st.session_state.jobs.discard(job_key)
+    else:
+        scored = True
 
 end_pct  = round(float(res["score"]) * 100.0, 1)
-prev_pct = float(st.session_state.last_score.get(job_key, 0.0))
+prev_pct = float(st.session_state.jobs.last_score(job_key))
 
 col_gauge, col_expl = st.columns([1,1])
 
@@ -233,13 +329,13 @@ with col_gauge:
             gauge={"axis": {"range": [0, 100]}},
             title={"text": f"Person {person_idx + 1}"}
         )],
-        frames=[go.Frame(data=[go.Indicator(value=end_pct)])] if fut.done() else []
+        frames=[go.Frame(data=[go.Indicator(value=end_pct)])] if scored else []
     )
     fig.update_layout(height=320, margin=dict(l=20, r=20, t=40, b=20))
 
     # html export + client-side animation trigger
     html = fig.to_html(include_plotlyjs="cdn", full_html=False)
-    if fut.done():
+    if scored:
         html += """
 <script>
 const gd = window.frameElement ? window.frameElement.parentElement.querySelector('.plotly-graph-div') : document.querySelector('.plotly-graph-div');
@@ -253,108 +349,106 @@ if (gd) {
 # set explanation
 with col_expl:
     st.subheader("Reason")
-    if fut.done():
+    if fut is None:
+        st.warning(_llm_backend().status_text())
+    elif fut.done() and res.get("failed"):
+        st.error(res.get("expl") or "Model call failed")
+        st.button("Retry", key=f"retry_{job_key}")
+    elif fut.done():
         st.markdown(res.get("expl_short") or "No short explanation.")
         with st.expander("More details"):
-            st.write(res.get("expl") or "")
+            if res.get("expl") is not None:
+                st.write(res.get("expl") or "")
+            else:
+                # second phase: found in the result store if prefetched or generated before
+                expl_key = f"{job_key}:expl"
+                expl_args = (row["X"], detailed, pskills, goal_text, interests_text, person_idx,
+                             res["score"], res.get("expl_short") or "")
+                expl_kwargs = {"parts": res.get("parts")}
+                efut = st.session_state.jobs.get(expl_key)
+                if efut is None and st.button("Generate detailed explanation", key=f"explain_{job_key}"):
+                    # a prefetch of the same explanation may be running already -> share it
+                    efut = _idle_queue().claim(expl_key)
+                    if efut is not None:
+                        st.session_state.jobs.adopt(expl_key, efut)
+                    else:
+                        efut = st.session_state.jobs.submit(expl_key, _explanation_worker, *expl_args,
+                                                            **expl_kwargs)
+                if efut is None:
+                    if PREFETCH_EXPLANATION:
+                        _idle_queue().enqueue(expl_key, _explanation_worker, *expl_args, **expl_kwargs)
+                elif not efut.done():
+                    st.write("Generating explanation...")
+                    st_autorefresh(interval=1000, key=f"poll_{expl_key}")
+                else:
+                    expl_res = efut.result()
+                    if expl_res.get("failed"):
+                        st.session_state.jobs.discard(expl_key)
+                        st.error(expl_res.get("expl") or "Model call failed")
+                        st.button("Retry", key=f"retry_{expl_key}")
+                    else:
+                        st.write(expl_res["expl"])
     else:
         st.write("Berechne...")
 
 # check for final score
-if fut.done():
-    st.session_state.last_score[job_key] = end_pct
+if scored:
+    st.session_state.jobs.set_last_score(job_key, end_pct)
+
+st.markdown("---")
+
+# ---- Similar activities ----
+
+@st.cache_resource
+def _activity_index():
+    # only opens the memory-mapped index; missing rows are embedded in the background (start_sync)
+    return ActivityIndex()
+
+
+@st.cache_data(max_entries=2)
+def _row_by_key(version, _df):
+    return {activity_id(str(x)): i for i, x in enumerate(_df["X"])}
+
+
+st.markdown("#### Similar Activities")
+_index = _activity_index()
+# no-op while a sync runs, for a synced dataset version, or during the backoff after a failure
+_index.start_sync(data_df["X"], st.session_state.dataset.version)
+_qvec = _index.vector(str(row["X"]))
+if _qvec is None and _index.syncing:
+    st.caption(f"Indexing activities... ({len(_index)} of {len(data_df)} indexed)")
+elif _qvec is None:
+    st.caption("Similarity index not available (is the embedding model loaded in LM Studio?)"
+               + (f" ({_index.sync_error})." if _index.sync_error else "."))
+else:
+    _rows = _row_by_key(st.session_state.dataset.version, data_df)
+    for _key, _sim in _index.search(_qvec, k=5, exclude=[activity_id(str(row["X"]))])[0]:
+        _i = _rows.get(_key)
+        if _i is None:
+            continue
+        _x = str(data_df.iloc[_i]["X"])
+        sim_col1, sim_col2 = st.columns([1, 8], vertical_alignment="center")
+        with sim_col1:
+            if st.button(f"▶ {_i}", key=f"similar_{_i}", use_container_width=True):
+                st.session_state.task_idx = _i
+                st.rerun()
+        with sim_col2:
+            st.markdown(f"**{_sim:.2f}** · {_x[:160]}{'…' if len(_x) > 160 else ''}")
 
 st.markdown("---")
 
 # ---- Skill-table with hover cards ----
 st.markdown("#### Skill-Tabelle")
 
-y_true = set(row.get("Y") or [])
-y_pred = set(row.get("y_pred") or [])
-idx = {}
-for d in detailed:
-    sk = d.get("skill")
-    if sk:
-        idx.setdefault(sk, []).append(d)
-
-# helper functions
-def _flag_any(skill, key):
-    return any(bool(o.get(key)) for o in idx.get(skill, []))
-
-def _uniq_reasons(skill):
-    seen, out = set(), []
-    for o in idx.get(skill, []):
-        r = (o.get("reason") or o.get("why") or "").strip()
-        if r and r not in seen:
-            seen.add(r); out.append(r)
-    return out
-
-def _esc(s: str) -> str:
-    return (str(s).replace("&","&amp;").replace("<","&lt;").replace(">","&gt;"))
-
-all_skills = sorted(set(y_true) | set(y_pred) | set(idx.keys()))
-p_set = set(persons[person_idx])
-
-rows = []
-for sk in all_skills:
-    needed  = _flag_any(sk, "needed")
-    optional= _flag_any(sk, "optional")
-    train   = _flag_any(sk, "trainable")
-    gt      = sk in y_true
-
-    if gt and needed:         group = 0
-    elif gt and optional:     group = 1
-    elif (not gt) and needed: group = 3
-    elif gt and (not needed): group = 2
-    elif gt or needed or optional or train: group = 4
-    else:                     group = 5
-
-    reasons = _uniq_reasons(sk)
-    if reasons:
-        reason_html = "".join(f'<div class="es-reason">{_esc(r)}</div>' for r in reasons)
-        skill_cell = (
-            f'<span class="es-tooltip" tabindex="0">'
-            f'  <mark>{_esc(sk)}</mark>'
-            f'  <div class="es-card"><div class="es-tip">'
-            f'    <details class="es-acc" open><summary>Reasons</summary>{reason_html}</details>'
-            f'  </div></div>'
-            f'</span>'
-        )
-    else:
-        skill_cell = _esc(sk)
-
-    rows.append({
-        "_group": group,
-        "Skill": skill_cell,
-        "GT": "x" if gt else "",
-        "Needed": "x" if needed else "",
-        "Optional": "x" if optional else "",
-        "Trainable": "x" if train else "",
-        "Person": "x" if sk in p_set else "",
-    })
-
-df = pd.DataFrame(rows).sort_values(["_group","Skill"], kind="mergesort").reset_index(drop=True)
-row_groups = df["_group"].to_list()
-df_disp = df.drop(columns=["_group"])
-
-cmap = {0:"#dcfce7", 1:"#FFE7BA", 2:"#fee2e2", 3:"#ff6961", 4:"#e0e7ff", 5:"#ffffff"}
-
-# manual render of dataframe as HTML table
-cols = list(df_disp.columns)
-html = [
-    '<table class="dataframe" style="width:100%; border-collapse:separate; border-spacing:0; font-size:14px;">',
-    '<thead><tr>',
-]
-for c in cols:
-    html.append(f'<th style="text-align:left; padding:8px; border-bottom:1px solid #e2e8f0;">{_esc(c)}</th>')
-html.append('</tr></thead><tbody>')
-
-for i, r in df_disp.iterrows():
-    bg = cmap.get(int(row_groups[i]), "#ffffff")
-    html.append(f'<tr style="background:{bg};">')
-    for c in cols:
-        html.append(f'<td style="padding:6px 8px; border-bottom:1px solid #f1f5f9;">{r[c]}</td>')
-    html.append('</tr>')
-
-html.append('</tbody></table>')
-st.markdown("".join(html), unsafe_allow_html=True)
\ No newline at end of file
+table_html = _artifacts().table(row_key, person_idx, persons)
+if table_html is None:
+    table_html = build_skill_table(detailed, row.get("Y"), row.get("y_pred"), persons[person_idx])
+st.markdown(table_html, unsafe_allow_html=True)
+
+# ---- Process gauge ----
+_gauge = process_gauge()
+st.sidebar.caption(_llm_backend().status_text())
+st.sidebar.caption(
+    f"Sessions: {_gauge['sessions']} · Jobs: {_gauge['jobs']} "
+    f"({_gauge['running']} running, {_gauge['queued']} queued) · Threads: {_gauge['threads']}"
+)
@@ -0,0 +1,224 @@
+# benchmark.py
+# Replays (activity, person) match prompts against several models/endpoints and compares
+# latency, throughput, JSON failures and score agreement with a reference model.
+#   python benchmark.py --targets openai/gpt-oss-20b qwen/qwen3-4b@http://gpu2:1234/v1 --concurrency 1 4 8
+import argparse
+import concurrent.futures
+import json
+import time
+import numpy as np
+from data import DEFAULT_GOAL, DEFAULT_INTERESTS, load_data_df, persons
+from functions import LLM_FAST_MAX_TOKENS, _build_prompt, _extract_json_payload
+from lm_studio_client import LMStudioClient
+
+DEFAULT_BASE_URL = "http://localhost:1234/v1"
+
+
+def parse_target(spec, default_base_url=DEFAULT_BASE_URL):
+    """
+    Parses "model" or "model@base_url".
+
+    Returns:
+        tuple: (model, base_url)
+    """
+    model, _, base_url = spec.partition("@")
+    return model, base_url or default_base_url
+
+
+def sample_prompts(df, persons, n, seed=0, detailed=True, goal=DEFAULT_GOAL, interests=DEFAULT_INTERESTS):
+    """
+    Fixed random sample of (activity, person) match prompts.
+
+    Args:
+        df (pd.DataFrame): Dataset with X and y_pred_detailed.
+        persons (list): Skill lists of the persons.
+        n (int): Number of prompts.
+        seed (int): Sampling seed; the same seed gives the same sample.
+        detailed (bool): Prompt with the long explanation (see _build_prompt()).
+
+    Returns:
+        list: Dicts with 'row', 'person' and 'prompt'. Long texts are not split into parts like
+        in the dashboard (_map_reduce_worker()), so the benchmark does not cover that path.
+    """
+    rng = np.random.default_rng(seed)
+    pairs = [(r, p) for r in range(len(df)) for p in range(len(persons))]
+    picks = rng.choice(len(pairs), min(n, len(pairs)), replace=False)
+    out = []
+    for i in sorted(picks):
+        r, p = pairs[i]
+        row = df.iloc[r]
+        prompt = _build_prompt(row["X"], row.get("y_pred_detailed") or [], persons[p], goal, interests, p, detailed)
+        out.append({"row": int(r), "person": int(p), "prompt": prompt})
+    return out
+
+
+def _run_one(client, prompt, max_tokens):
+    # one timed request; errors are recorded, not raised
+    t0 = time.perf_counter()
+    try:
+        raw, usage = client.chat_with_usage([{"role": "user", "content": prompt}], temperature=0,
+                                            max_tokens=max_tokens)
+    except Exception as e:
+        return {"latency": time.perf_counter() - t0, "error": type(e).__name__}
+    latency = time.perf_counter() - t0
+    payload = _extract_json_payload(raw)
+    try:
+        score = max(0.0, min(1.0, float(payload["score"])))
+    except (KeyError, TypeError, ValueError):
+        score = None
+    recommend = payload.get("recommend") if isinstance(payload, dict) else None
+    return {"latency": latency, "error": None, "score": score,
+            "recommend": recommend if isinstance(recommend, bool) else None,
+            "completion_tokens": usage["completion_tokens"], "prompt_tokens": usage["prompt_tokens"]}
+
+
+def run_target(model, base_url, prompts, concurrency, max_tokens, timeout=300.0):
+    """
+    Sends all prompts to one model with `concurrency` requests in flight.
+
+    Returns:
+        tuple: (results per prompt in input order, wall-clock seconds)
+    """
+    client = LMStudioClient(base_url=base_url, model=model, timeout=timeout)
+    t0 = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as ex:
+        results = list(ex.map(lambda p: _run_one(client, p["prompt"], max_tokens), prompts))
+    return results, time.perf_counter() - t0
+
+
+def summarize(results, wall, reference=None):
+    """
+    Latency, throughput, failure and agreement figures of one run.
+
+    Args:
+        results (list): Output of run_target().
+        wall (float): Wall-clock seconds of the run.
+        reference (list, optional): Results of the reference model for the same prompts.
+
+    Returns:
+        dict: Report row.
+    """
+    ok = [r for r in results if r["error"] is None]
+    lat = np.array([r["latency"] for r in ok]) if ok else np.zeros(0)
+    completion = sum(r["completion_tokens"] for r in ok)
+    parsed = [r for r in ok if r["score"] is not None]
+    row = {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "json_fail_rate": round(1 - len(parsed) / len(ok), 3) if ok else None,
+        "p50_s": round(float(np.percentile(lat, 50)), 2) if len(lat) else None,
+        "p90_s": round(float(np.percentile(lat, 90)), 2) if len(lat) else None,
+        "p99_s": round(float(np.percentile(lat, 99)), 2) if len(lat) else None,
+        "req_per_min": round(len(ok) / wall * 60.0, 1),
+        "completion_tok_per_s": round(completion / wall, 1),
+        "mean_completion_tokens": round(completion / len(ok), 1) if ok else None,
+    }
+    if reference is not None:
+        pairs = [(r["score"], ref["score"]) for r, ref in zip(results, reference)
+                 if r.get("score") is not None and ref.get("score") is not None]
+        rec = [(r["recommend"], ref["recommend"]) for r, ref in zip(results, reference)
+               if r.get("recommend") is not None and ref.get("recommend") is not None]
+        if pairs:
+            a, b = np.array(pairs).T
+            row["score_mae"] = round(float(np.mean(np.abs(a - b))), 3)
+            row["within_0.1"] = round(float(np.mean(np.abs(a - b) <= 0.1)), 3)
+            # undefined if either model gives the same score everywhere
+            varies = len(set(a.tolist())) > 1 and len(set(b.tolist())) > 1
+            row["score_corr"] = round(float(np.corrcoef(a, b)[0, 1]), 3) if varies else None
+        row["recommend_agree"] = round(float(np.mean([x == y for x, y in rec])), 3) if rec else None
+    return row
+
+
+def run_benchmark(targets, prompts, concurrency_levels, reference=None, max_tokens=2048, timeout=300.0):
+    """
+    Runs every target at every concurrency level and compares the scores with the reference.
+
+    Each target gets one warm-up request first, so model loading is not part of the latency.
+    Agreement is measured against the reference's run at the lowest concurrency level.
+
+    Args:
+        targets (list): (model, base_url) tuples.
+        prompts (list): Output of sample_prompts().
+        concurrency_levels (list): Requests in flight, e.g. [1, 4, 8].
+        reference (tuple, optional): (model, base_url) of the reference (default: first target).
+        max_tokens (int): Completion token limit per request.
+        timeout (float): Per-request timeout in seconds.
+
+    Returns:
+        list: Report rows with 'model', 'base_url' and 'concurrency'.
+    """
+    reference = reference or targets[0]
+    levels = sorted(set(concurrency_levels))
+    ref_results = None
+    ordered = [reference] + [t for t in targets if t != reference]
+    rows = []
+    for model, base_url in ordered:
+        try:
+            LMStudioClient(base_url=base_url, model=model, timeout=timeout).chat(
+                [{"role": "user", "content": "Hi"}], temperature=0, max_tokens=1)
+        except Exception as e:
+            print(f"Warm-up of {model}@{base_url} failed: {type(e).__name__}")
+        for c in levels:
+            results, wall = run_target(model, base_url, prompts, c, max_tokens, timeout)
+            if ref_results is None:
+                ref_results = results
+            row = {"model": model, "base_url": base_url, "concurrency": c}
+            row.update(summarize(results, wall, ref_results))
+            rows.append(row)
+            print(json.dumps(row))
+    return rows
+
+
+def report_markdown(rows, meta):
+    """
+    Comparison table of all runs as markdown.
+    """
+    cols = ["model", "base_url", "concurrency", "p50_s", "p90_s", "p99_s", "req_per_min",
+            "completion_tok_per_s", "json_fail_rate", "errors", "score_mae", "within_0.1",
+            "score_corr", "recommend_agree"]
+    lines = [
+        "# Model benchmark",
+        "",
+        f"{meta['samples']} (activity, person) prompts, seed {meta['seed']}, "
+        f"{'detailed' if meta['detailed'] else 'score-only'} prompt, max_tokens {meta['max_tokens']}, "
+        f"reference `{meta['reference']}`.",
+        "",
+        "| " + " | ".join(cols) + " |",
+        "|" + "---|" * len(cols),
+    ]
+    for r in rows:
+        lines.append("| " + " | ".join("" if r.get(c) is None else str(r.get(c)) for c in cols) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark models/endpoints on the dashboard's match prompts.")
+    parser.add_argument("--targets", nargs="+", required=True, help="model or model@base_url")
+    parser.add_argument("--reference", default=None, help="model or model@base_url (default: first target)")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="base URL of targets without @")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--samples", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--score-only", action="store_true", help="use the two-phase score-only prompt")
+    parser.add_argument("--max-tokens", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", default="benchmark_report", help="writes <output>.md and <output>.json")
+    args = parser.parse_args()
+
+    targets = [parse_target(t, args.base_url) for t in args.targets]
+    reference = parse_target(args.reference, args.base_url) if args.reference else targets[0]
+    max_tokens = args.max_tokens or (LLM_FAST_MAX_TOKENS if args.score_only else 4096)
+    prompts = sample_prompts(load_data_df(), persons, args.samples, args.seed, detailed=not args.score_only)
+    rows = run_benchmark(targets, prompts, args.concurrency, reference, max_tokens, args.timeout)
+
+    meta = {"samples": len(prompts), "seed": args.seed, "detailed": not args.score_only,
+            "max_tokens": max_tokens, "reference": "@".join(reference)}
+    with open(args.output + ".json", "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "rows": rows}, f, indent=2)
+    with open(args.output + ".md", "w", encoding="utf-8") as f:
+        f.write(report_markdown(rows, meta))
+    print(report_markdown(rows, meta))
+
+
+if __name__ == "__main__":
+    main()
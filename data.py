@@ -1,9 +1,31 @@
-import pandas as pd
 import ast
+from dataset_manager import DatasetManager
 
-data_df = pd.read_csv("data/volunteer_activities_transversal_skills_predictions_new_prompt_new_no_batch_new.csv",
-                      converters={"y_pred_detailed": ast.literal_eval, "Y": ast.literal_eval,
-                                  "y_pred": ast.literal_eval})
+DATA_DIR = "data"
+DATA_CONVERTERS = {"y_pred_detailed": ast.literal_eval, "Y": ast.literal_eval, "y_pred": ast.literal_eval}
+
+
+def load_data_df():
+    """
+    All rows of the prediction files in DATA_DIR, as the dashboard shows them.
+
+    Parsed on call instead of at import, so modules that only need the persons or the
+    configuration (app.py, prerender workers) do not read the CSV files.
+
+    Returns:
+        pd.DataFrame: Current DatasetManager snapshot.
+    """
+    return DatasetManager(DATA_DIR, converters=DATA_CONVERTERS).snapshot().df
+
+
+def load_esco_skills(df):
+    """
+    ESCO transversal skills assessed in y_pred_detailed of `df`.
+
+    Returns:
+        list: Sorted skill names.
+    """
+    return sorted({d["skill"] for objs in df["y_pred_detailed"] for d in objs if d.get("skill")})
 
 person_1 = [
     "assume responsibility",
@@ -113,4 +135,8 @@ person_5 = [
     "demonstrate awareness of health risks "
 ]
 
-persons = [person_1, person_2, person_3, person_4, person_5]
\ No newline at end of file
+persons = [person_1, person_2, person_3, person_4, person_5]
+
+# goal and interests every person starts with in the dashboard; also used by the benchmark prompts
+DEFAULT_GOAL = "I want to go outside more often"
+DEFAULT_INTERESTS = "Computer Games, Cinema, Pets"
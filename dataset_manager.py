@@ -0,0 +1,196 @@
+# dataset_manager.py
+# Watches the data directory and ingests new or appended prediction files in the background.
+import glob
+import hashlib
+import io
+import os
+import threading
+import pandas as pd
+
+# files without these columns are not prediction files and are ignored
+REQUIRED_COLUMNS = ("X", "y_pred_detailed")
+
+
+def activity_id(text: str) -> str:
+    """
+    Stable id of an activity text (extraction checkpoints, embedding and index keys).
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class DatasetSnapshot:
+    def __init__(self, version, df, files=None):
+        """
+        One version of the dataset. Never modified after publishing, so sessions can keep the
+        snapshot they started with.
+
+        Args:
+            version (int): Increasing version number.
+            df (pd.DataFrame): All rows of this version.
+            files (dict, optional): {path: number of rows} per source file.
+        """
+        self.version = version
+        self.df = df
+        self.files = files or {}
+
+    def __len__(self):
+        return len(self.df)
+
+
+class _FileState:
+    """
+    Ingestion state of one watched file.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.mtime = 0.0
+        self.offset = 0      # bytes consumed (end of the last complete record)
+        self.digest = hashlib.sha1()  # hash of the consumed bytes, detects rewritten files
+        self.header = ""
+        self.frame = None
+
+
+class DatasetManager:
+    def __init__(self, data_dir="data", pattern="*.csv", converters=None, interval=5.0):
+        """
+        Keeps the dashboard dataset in sync with the prediction files in `data_dir`.
+
+        A background thread polls the directory. New files are parsed completely; files that only
+        grew are parsed from the last consumed byte on, so rows already loaded are never converted
+        again; files that were rewritten are reloaded. Every change produces a new
+        DatasetSnapshot that replaces the current one atomically.
+
+        Args:
+            data_dir (str): Directory with the prediction CSV files.
+            pattern (str): Glob pattern of the files in `data_dir`.
+            converters (dict, optional): Column converters for pd.read_csv (e.g. ast.literal_eval).
+            interval (float): Seconds between directory polls.
+        """
+        self.data_dir = data_dir
+        self.pattern = pattern
+        self.converters = converters or {}
+        self.interval = interval
+        self._files = {}  # {path: _FileState}, in load order
+        self._snapshot = DatasetSnapshot(0, pd.DataFrame(columns=["X", "Y", "y_pred", "y_pred_detailed"]))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.refresh()
+
+    def snapshot(self) -> DatasetSnapshot:
+        """
+        Returns the current dataset version.
+        """
+        return self._snapshot
+
+    def start(self):
+        """
+        Starts the background polling thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def _loop():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Dataset refresh failed: {type(e).__name__}: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=_loop, name="dataset-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background polling thread.
+        """
+        self._stop.set()
+
+    def refresh(self) -> bool:
+        """
+        Ingests new and appended files once.
+
+        Returns:
+            bool: True if a new snapshot was published.
+        """
+        with self._lock:
+            changed = False
+            paths = sorted(glob.glob(os.path.join(self.data_dir, self.pattern)))
+            for path in paths:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                state = self._files.get(path)
+                if state is not None and st.st_size == state.size and st.st_mtime == state.mtime:
+                    continue
+                if state is None or st.st_size < state.offset or not self._same_prefix(path, state):
+                    # new or rewritten/truncated file -> parse completely
+                    state = _FileState()
+                    frame = self._read(path, state)
+                elif st.st_size > state.offset:
+                    # appended -> parse only the new bytes
+                    frame = self._read(path, state)
+                else:
+                    frame = None  # touched without new data
+                state.size, state.mtime = st.st_size, st.st_mtime
+                if frame is not None and not all(c in frame.columns for c in REQUIRED_COLUMNS):
+                    frame = None
+                if frame is not None and len(frame):
+                    state.frame = frame if state.frame is None else pd.concat([state.frame, frame], ignore_index=True)
+                    changed = True
+                self._files[path] = state
+            for path in [p for p in self._files if p not in paths]:
+                del self._files[path]
+                changed = True
+            if changed:
+                frames = [s.frame for s in self._files.values() if s.frame is not None]
+                df = pd.concat(frames, ignore_index=True) if frames else self._snapshot.df.iloc[0:0]
+                files = {p: (0 if s.frame is None else len(s.frame)) for p, s in self._files.items()}
+                self._snapshot = DatasetSnapshot(self._snapshot.version + 1, df, files)
+            return changed
+
+    @staticmethod
+    def _same_prefix(path, state, block=1 << 20):
+        # the bytes before the offset must be unchanged for an append; hashing them is still far
+        # cheaper than parsing, and a rewrite that keeps size and last bytes is detected as well
+        if not state.offset:
+            return True
+        digest, left = hashlib.sha1(), state.offset
+        with open(path, "rb") as f:
+            while left:
+                data = f.read(min(block, left))
+                if not data:
+                    return False
+                digest.update(data)
+                left -= len(data)
+        return digest.digest() == state.digest.digest()
+
+    def _read(self, path, state):
+        """
+        Parses the complete records from `state.offset` to the end of the file and advances the offset.
+        Returns None if no complete record is available yet (e.g. a writer is mid-row).
+        """
+        with open(path, "rb") as f:
+            f.seek(state.offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1
+        if end == 0:
+            return None
+        chunk = chunk[:end]
+        text = chunk.decode("utf-8")
+        if state.offset == 0:
+            header, _, body = text.partition("\n")
+            state.header = header
+        else:
+            body = text
+        try:
+            frame = pd.read_csv(io.StringIO(state.header + "\n" + body), converters=self.converters)
+        except (pd.errors.ParserError, ValueError, SyntaxError):
+            # quoted field still open -> record not complete yet, retry on the next poll
+            return None
+        state.offset += len(chunk)
+        state.digest.update(chunk)
+        return frame
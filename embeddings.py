@@ -0,0 +1,363 @@
+# embeddings.py
+# Embedding store and retrieval of candidate skills before the LLM assessment.
+#   python embeddings.py --k 5 10 20 30
+import argparse
+import json
+import os
+import re
+import threading
+import numpy as np
+from dataset_manager import activity_id
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-nomic-embed-text-v1.5")
+EMBEDDING_DIR = os.environ.get("EMBEDDING_DIR", "data/embeddings")
+
+
+def store_path(name, model=EMBEDDING_MODEL, root=EMBEDDING_DIR):
+    """
+    Path prefix of the store `name` for embeddings of `model`; every model gets its own
+    directory, so switching models never mixes vector spaces.
+    """
+    return os.path.join(root, re.sub(r"[^A-Za-z0-9._-]+", "_", model), name)
+
+
+# largest quantized value; each row is scaled so its largest component maps to it
+_QUANT_MAX = {"int8": 127.0}
+
+
+class EmbeddingStore:
+    def __init__(self, path, dtype="float32", model=None):
+        """
+        Append-only store of L2-normalized embeddings in a memory-mapped NumPy file.
+
+        The vectors live in `<path>.bin` (raw rows), keys, shape and embedding model in
+        `<path>.json`. Appending only writes the new rows, reading maps the file without loading
+        it into memory. Quantized (int8) rows carry their own scale in `<path>.scale`, so the
+        largest component of every vector uses the full int8 range.
+
+        Args:
+            path (str): Path prefix of the store files (see store_path()).
+            dtype (str): Storage dtype of the vectors ("float32", "float16" or "int8").
+            model (str, optional): Embedding model of the vectors, checked against the stored one.
+
+        Raises:
+            ValueError: If the store holds embeddings of another model.
+        """
+        self.path = path
+        self.model = model
+        self.dtype = np.dtype(dtype)
+        self.keys = []
+        self.dim = None
+        self._index = {}
+        self._matrix = None
+        self._scales = np.zeros(0, dtype=np.float32)  # per-row quantization scale
+        self._lock = threading.Lock()
+        if os.path.exists(path + ".json"):
+            with open(path + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+            if model and meta.get("model") and meta["model"] != model:
+                raise ValueError(f"Store {path} enthält Embeddings von {meta['model']}, nicht von {model}.")
+            self.model = model or meta.get("model")
+            self.keys, self.dim, self.dtype = meta["keys"], meta["dim"], np.dtype(meta["dtype"])
+            self._index = {k: i for i, k in enumerate(self.keys)}
+            # drop rows of an append that crashed before its keys were saved
+            size = len(self.keys) * self.dim * self.dtype.itemsize if self.dim else 0
+            if os.path.exists(path + ".bin") and os.path.getsize(path + ".bin") > size:
+                with open(path + ".bin", "r+b") as f:
+                    f.truncate(size)
+            if self.quantized:
+                self._scales = self._load_scales()
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def quantized(self):
+        return self.dtype.name in _QUANT_MAX
+
+    def _load_scales(self):
+        n = len(self.keys)
+        if not os.path.exists(self.path + ".scale"):
+            # stores written before per-row scales used the fixed maximum
+            return np.full(n, _QUANT_MAX[self.dtype.name], dtype=np.float32)
+        if os.path.getsize(self.path + ".scale") > n * 4:
+            with open(self.path + ".scale", "r+b") as f:
+                f.truncate(n * 4)
+        return np.fromfile(self.path + ".scale", dtype=np.float32, count=n)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    @property
+    def matrix(self):
+        """
+        Read-only memory map of all vectors, shape (len(self), dim).
+        """
+        if self._matrix is None or len(self._matrix) != len(self.keys):
+            if not self.keys:
+                return np.zeros((0, self.dim or 0), dtype=self.dtype)
+            self._matrix = np.memmap(self.path + ".bin", dtype=self.dtype, mode="r",
+                                     shape=(len(self.keys), self.dim))
+        return self._matrix
+
+    def get(self, keys):
+        """
+        Returns the vectors of `keys` as float32 array.
+
+        Raises:
+            KeyError: If a key is not in the store.
+        """
+        return self.take([self._index[k] for k in keys])
+
+    def take(self, rows):
+        """
+        Returns the vectors at row positions `rows` (index array or slice) as float32 array.
+        """
+        return self.dequantize(self.matrix[rows], rows)
+
+    def dequantize(self, block, rows):
+        """
+        Converts the stored rows `rows` (`block`) to float32.
+        """
+        block = np.asarray(block, dtype=np.float32)
+        if not self.quantized:
+            return block
+        return block / self._scales[rows][:, None]
+
+    def row(self, key):
+        """
+        Row position of `key` or None.
+        """
+        return self._index.get(key)
+
+    def add(self, keys, vectors):
+        """
+        Appends vectors (normalized here) for new keys; keys already present are skipped.
+
+        Args:
+            keys (list): Keys of the vectors.
+            vectors (array-like): Shape (len(keys), dim).
+        """
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            new = [i for i, k in enumerate(keys) if k not in self._index]
+            if not new:
+                return
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Dimension {vectors.shape[1]} passt nicht zum Store ({self.dim}).")
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            block = vectors[new]
+            if self.quantized:
+                qmax = _QUANT_MAX[self.dtype.name]
+                scales = (qmax / np.maximum(np.abs(block).max(axis=1), 1e-12)).astype(np.float32)
+                block = np.clip(np.rint(block * scales[:, None]), -qmax, qmax)
+                with open(self.path + ".scale", "ab") as f:
+                    f.write(scales.tobytes())
+                self._scales = np.concatenate([self._scales, scales])
+            with open(self.path + ".bin", "ab") as f:
+                f.write(block.astype(self.dtype).tobytes())
+            for i in new:
+                self._index[keys[i]] = len(self.keys)
+                self.keys.append(keys[i])
+            self._save_meta()
+
+    def _save_meta(self):
+        # write-then-rename so readers never see keys without rows
+        tmp = self.path + ".json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"keys": self.keys, "dim": self.dim, "dtype": self.dtype.name, "model": self.model}, f)
+        os.replace(tmp, self.path + ".json")
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def embed_texts(texts, client=None, model=EMBEDDING_MODEL, batch_size=64):
+    """
+    Embeds texts via the local /v1/embeddings endpoint.
+
+    Args:
+        texts (list): Texts to embed.
+        client (LMStudioClient or LMStudioPool, optional): Defaults to the client from functions.py,
+            imported on first use so that importing this module does not build it.
+        model (str): Embedding model name.
+        batch_size (int): Texts per request.
+
+    Returns:
+        np.ndarray: L2-normalized float32 array of shape (len(texts), dim).
+    """
+    if client is None:
+        from functions import lm_studio_client as client
+    out = []
+    for i in range(0, len(texts), batch_size):
+        out.extend(client.embed(texts[i:i + batch_size], model))
+    return _normalize(np.asarray(out, dtype=np.float32))
+
+
+def embed_missing(store, keys, texts, client=None, model=EMBEDDING_MODEL, batch_size=64, save_every=1024):
+    """
+    Embeds the texts whose keys are missing in `store` and appends them.
+
+    Vectors are appended every `save_every` texts, so a failing request only loses the texts
+    embedded since the last append and the next call continues from there.
+
+    Args:
+        store (EmbeddingStore): Target store.
+        keys (list): Keys of the texts.
+        texts (list): Texts to embed if missing.
+        batch_size (int): Texts per embedding request.
+        save_every (int): Texts per append to the store.
+
+    Returns:
+        int: Number of newly embedded texts.
+    """
+    # texts may repeat, embed each once
+    missing = list({k: i for i, k in enumerate(keys) if k not in store}.values())
+    for start in range(0, len(missing), save_every):
+        part = missing[start:start + save_every]
+        store.add([keys[i] for i in part], embed_texts([texts[i] for i in part], client, model, batch_size))
+    return len(missing)
+
+
+def ensure_embeddings(store, keys, texts, client=None, model=EMBEDDING_MODEL, batch_size=64):
+    """
+    Embeds only the texts whose keys are missing in `store` and returns the vectors of all keys.
+
+    Args:
+        store (EmbeddingStore): Target store.
+        keys (list): Keys of the texts.
+        texts (list): Texts to embed if missing.
+
+    Returns:
+        np.ndarray: Float32 array of shape (len(keys), dim).
+    """
+    embed_missing(store, keys, texts, client, model, batch_size)
+    return store.get(keys)
+
+
+def skill_texts(skills, descriptions=None):
+    """
+    Texts embedded for the skills: the ESCO label plus its description if available.
+
+    Args:
+        skills (list): Skill labels.
+        descriptions (dict, optional): {skill: ESCO description}.
+
+    Returns:
+        list: One text per skill.
+    """
+    descriptions = descriptions or {}
+    return [f"{sk.strip()}: {descriptions[sk]}" if descriptions.get(sk) else f"ESCO transversal skill: {sk.strip()}"
+            for sk in skills]
+
+
+def top_k_candidates(activity_vecs, skill_vecs, k):
+    """
+    Indices of the k most similar skills per activity (cosine similarity), best first.
+
+    Args:
+        activity_vecs (np.ndarray): Normalized activity vectors, shape (n, dim).
+        skill_vecs (np.ndarray): Normalized skill vectors, shape (m, dim).
+        k (int): Candidates per activity.
+
+    Returns:
+        np.ndarray: Int array of shape (n, min(k, m)).
+    """
+    sims = activity_vecs @ skill_vecs.T
+    k = min(k, sims.shape[1])
+    idx = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(sims, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def candidate_recall(candidates, labels, skills):
+    """
+    Share of ground-truth skills that survive the candidate pruning.
+
+    Args:
+        candidates (np.ndarray): Output of top_k_candidates.
+        labels (list): Ground-truth skill lists per activity (e.g. data_df["Y"]).
+        skills (list): Skill labels matching the columns of the skill vectors.
+
+    Returns:
+        dict: 'micro' (over all labels) and 'macro' (mean per activity) recall.
+    """
+    norm = {sk.strip(): i for i, sk in enumerate(skills)}
+    hits = total = 0
+    per_row = []
+    for cand, y in zip(candidates, labels):
+        y_idx = {norm[s.strip()] for s in y if s.strip() in norm}
+        if not y_idx:
+            continue
+        h = len(y_idx & set(cand.tolist()))
+        hits, total = hits + h, total + len(y_idx)
+        per_row.append(h / len(y_idx))
+    return {"micro": hits / total if total else None,
+            "macro": float(np.mean(per_row)) if per_row else None}
+
+
+def _load_vectors(texts, skills, client=None, descriptions=None, store_dir=EMBEDDING_DIR, model=EMBEDDING_MODEL):
+    """
+    Activity and skill vectors from the embedding stores of `model`, embedding what is missing.
+
+    Returns:
+        tuple: (activity_vecs, skill_vecs) as float32 arrays.
+    """
+    s_texts = skill_texts(skills, descriptions)
+    skill_store = EmbeddingStore(store_path("skills", model, store_dir), model=model)
+    skill_vecs = ensure_embeddings(skill_store, s_texts, s_texts, client, model)
+    activity_store = EmbeddingStore(store_path("activities", model, store_dir), model=model)
+    activity_vecs = ensure_embeddings(activity_store, [activity_id(t) for t in texts], texts, client, model)
+    return activity_vecs, skill_vecs
+
+
+def skill_candidates(texts, skills, k, client=None, descriptions=None, store_dir=EMBEDDING_DIR,
+                     model=EMBEDDING_MODEL):
+    """
+    Top-k candidate skills per activity text, using (and filling) the embedding stores.
+
+    Args:
+        texts (list): Activity texts.
+        skills (list): Skill labels.
+        k (int): Candidates per activity.
+        client (LMStudioClient or LMStudioPool, optional): Defaults to the client from functions.py.
+        descriptions (dict, optional): {skill: ESCO description}.
+        store_dir (str): Directory of the embedding stores.
+        model (str): Embedding model name.
+
+    Returns:
+        list: Candidate skill lists per text, most similar first.
+    """
+    activity_vecs, skill_vecs = _load_vectors(texts, skills, client, descriptions, store_dir, model)
+    return [[skills[j] for j in row] for row in top_k_candidates(activity_vecs, skill_vecs, k)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall of embedding-based skill candidates against Y.")
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10, 20, 30, 40])
+    parser.add_argument("--descriptions", default=None, help="JSON file {skill: ESCO description}")
+    args = parser.parse_args()
+
+    from data import load_data_df, load_esco_skills
+
+    data_df = load_data_df()
+    esco_skills = load_esco_skills(data_df)
+
+    descriptions = None
+    if args.descriptions:
+        with open(args.descriptions, encoding="utf-8") as f:
+            descriptions = json.load(f)
+    activity_vecs, skill_vecs = _load_vectors(data_df["X"].astype(str).tolist(), esco_skills,
+                                              descriptions=descriptions)
+    for k in args.k:
+        rec = candidate_recall(top_k_candidates(activity_vecs, skill_vecs, k), data_df["Y"], esco_skills)
+        share = min(k, len(esco_skills)) / len(esco_skills)
+        print(f"k={k:3d}  assessed={share:6.1%}  recall micro={rec['micro']:.3f} macro={rec['macro']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+# extraction.py
+# Produces y_pred_detailed for new activity texts in the dashboard's dataset format.
+#   python extraction.py new_activities.csv data/new_predictions.csv --batch-size 8 --concurrency 4
+import argparse
+import concurrent.futures
+import json
+import os
+import threading
+import time
+import pandas as pd
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from dataset_manager import activity_id
+from functions import _extract_json_payload, _TRANSIENT_ERRORS, lm_studio_client
+
+
+def _build_extraction_prompt(x_text: str, skills: list) -> str:
+    """
+    Builds a prompt that assesses several ESCO transversal skills for one activity at once.
+
+    Args:
+        x_text (str): The activity text.
+        skills (list): Skill names to assess in this call.
+
+    Returns:
+        str: The formatted prompt string for the language model.
+    """
+    skill_lines = "\n".join(f"- {sk}" for sk in skills)
+    return f"""
+Task:
+Assess for each of the ESCO transversal skills below whether it is needed, optional or trainable
+for the volunteer activity.
+
+Activity Text:
+{x_text}
+
+Skills to assess:
+{skill_lines}
+
+Response (JSON list, one object per skill, in the same order):
+[{{"skill":"","needed":false,"optional":false,"trainable":false,"reason":"","span":null}}]
+
+Explanation of Response Fields:
+- skill: The skill name exactly as given above.
+- needed: true if the activity cannot be done without the skill.
+- optional: true if the skill helps but is not required.
+- trainable: true if the skill can be learned while doing the activity.
+- reason: One to three sentences explaining the assessment, citing the activity text.
+- span: The exact quote from the activity text that supports the assessment in double quotes, or null if there is none.
+
+IMPORTANT: ALWAYS RESPOND IN THE EXACT JSON FORMAT.
+""".strip()
+
+
+def _parse_assessments(raw, skills: list) -> list:
+    """
+    Parses the model response into one y_pred_detailed object per requested skill.
+
+    Args:
+        raw (str): The model response.
+        skills (list): The skills requested in the prompt.
+
+    Returns:
+        list: Dicts with 'skill', 'needed', 'optional', 'trainable', 'reason' and 'span'.
+
+    Raises:
+        ValueError: If the response does not cover every requested skill.
+    """
+    payload = _extract_json_payload(raw)
+    if isinstance(payload, dict):
+        # tolerate {"assessments": [...]} and similar wrappers
+        payload = next((v for v in payload.values() if isinstance(v, list)), [])
+    by_skill = {str(o.get("skill", "")).strip().lower(): o for o in payload if isinstance(o, dict)}
+    out = []
+    for sk in skills:
+        o = by_skill.get(sk.strip().lower())
+        if o is None:
+            raise ValueError(f"Skill fehlt in der Antwort: {sk}")
+        out.append({
+            "skill": sk,
+            "needed": bool(o.get("needed")),
+            "optional": bool(o.get("optional")),
+            "trainable": bool(o.get("trainable")),
+            "reason": str(o.get("reason") or ""),
+            "span": o.get("span") or None,
+        })
+    return out
+
+
+class ExtractionStats:
+    def __init__(self, price_per_1k_tokens=0.0, gpu_hour_cost=0.0):
+        """
+        Thread-safe throughput and cost counters of an extraction run.
+
+        Args:
+            price_per_1k_tokens (float): Cost per 1000 tokens (prompt + completion), e.g. for hosted backends.
+            gpu_hour_cost (float): Cost per hour of wall-clock time, e.g. for own GPU boxes.
+        """
+        self.price_per_1k_tokens = price_per_1k_tokens
+        self.gpu_hour_cost = gpu_hour_cost
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.failed_rows = 0
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def add_call(self, usage):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+
+    def add_row(self, failed=False):
+        with self._lock:
+            if failed:
+                self.failed_rows += 1
+            else:
+                self.rows += 1
+
+    def report(self) -> dict:
+        """
+        Returns the current throughput and cost figures.
+        """
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        tokens = self.prompt_tokens + self.completion_tokens
+        cost = tokens / 1000.0 * self.price_per_1k_tokens + elapsed / 3600.0 * self.gpu_hour_cost
+        return {
+            "rows": self.rows,
+            "failed_rows": self.failed_rows,
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "elapsed_s": round(elapsed, 1),
+            "rows_per_min": round(self.rows / elapsed * 60.0, 2),
+            "tokens_per_s": round(tokens / elapsed, 1),
+            "cost": round(cost, 4),
+            "cost_per_row": round(cost / self.rows, 6) if self.rows else None,
+        }
+
+
+def _load_checkpoint(path):
+    """
+    Reads finished skill assessments from the checkpoint file.
+
+    Records are keyed by skill, not by batch, so a run can resume with another batch size or
+    candidate set.
+
+    Returns:
+        dict: {activity_id: {skill: obj}}
+    """
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written last line after a crash
+            done.setdefault(rec["id"], {}).update({o["skill"]: o for o in rec["objs"]})
+    return done
+
+
+def _written_ids(output_path):
+    """
+    Ids of the activities already present in the output CSV.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    return {activity_id(x) for x in pd.read_csv(output_path, usecols=["X"])["X"].astype(str)}
+
+
+def _pruned(skill):
+    """
+    y_pred_detailed object for a skill dropped by the embedding candidate retrieval.
+    """
+    return {"skill": skill, "needed": False, "optional": False, "trainable": False,
+            "reason": "Not among the retrieved candidate skills for this activity.", "span": None}
+
+
+def run_extraction(texts, output_path, skills, client=None, labels=None, candidates=None, batch_size=8,
+                   concurrency=4, max_tokens=4096, stats=None, progress_every=50):
+    """
+    Runs skill extraction for activity texts and appends finished rows to `output_path`.
+
+    Each activity is assessed in batches of `batch_size` skills per call; batches of all activities
+    run concurrently on `concurrency` threads. Finished assessments are checkpointed per skill to
+    `<output_path>.ckpt.jsonl` and finished rows are appended as X, Y, y_pred, y_pred_detailed,
+    so an interrupted run resumes where it stopped, also with another batch size or candidate set.
+    Rows with a failed batch are not written and are retried by the next run; the checkpoint is
+    only deleted once every row is written.
+
+    Args:
+        texts (list): Activity texts.
+        output_path (str): CSV file to append to.
+        skills (list): ESCO skills to assess.
+        client (LMStudioClient or LMStudioPool, optional): Defaults to the client from functions.py.
+        labels (list, optional): Ground-truth skill lists per text, written as Y (default: []).
+        candidates (list, optional): Skill lists per text to assess in detail (see
+            embeddings.skill_candidates); all other skills are written as pruned negatives.
+        batch_size (int): Skills per model call.
+        concurrency (int): Parallel model calls.
+        max_tokens (int): Completion token limit per call.
+        stats (ExtractionStats, optional): Counters to update.
+        progress_every (int): Print a progress report every n finished rows (0 disables).
+
+    Returns:
+        dict: Final ExtractionStats report.
+    """
+    client = client or lm_studio_client
+    stats = stats or ExtractionStats()
+    labels = labels if labels is not None else [[] for _ in texts]
+    candidates = candidates if candidates is not None else [skills for _ in texts]
+    ckpt_path = output_path + ".ckpt.jsonl"
+
+    written = _written_ids(output_path)
+    partial = _load_checkpoint(ckpt_path)
+    pending = {}  # {activity_id: (text, label, assessed skills, {skill: obj})}
+    for text, label, cand in zip(texts, labels, candidates):
+        aid = activity_id(text)
+        if aid not in written and aid not in pending:
+            cand = set(cand)
+            assessed = [sk for sk in skills if sk in cand]
+            pending[aid] = (text, label, assessed, dict(partial.get(aid, {})))
+
+    @retry(retry=retry_if_exception_type(_TRANSIENT_ERRORS), stop=stop_after_attempt(4),
+           wait=wait_random_exponential(multiplier=1, max=30), reraise=True)
+    def _assess(text, batch):
+        raw, usage = client.chat_with_usage(
+            [{"role": "user", "content": _build_extraction_prompt(text, batch)}],
+            temperature=0, max_tokens=max_tokens,
+        )
+        stats.add_call(usage)
+        return _parse_assessments(raw, batch)
+
+    io_lock = threading.Lock()
+    failed = set()
+
+    def _finish_row(aid):
+        text, label, assessed, done = pending.pop(aid)
+        cand = set(assessed)
+        objs = [done[sk] if sk in cand else _pruned(sk) for sk in skills]
+        row = {"X": text, "Y": list(label), "y_pred": [o["skill"] for o in objs if o["needed"]],
+               "y_pred_detailed": objs}
+        pd.DataFrame([row]).to_csv(output_path, mode="a", index=False,
+                                   header=not os.path.exists(output_path))
+        stats.add_row()
+        if progress_every and stats.rows % progress_every == 0:
+            print(json.dumps(stats.report()))
+
+    with open(ckpt_path, "a", encoding="utf-8") as ckpt, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as ex:
+        futs = {}
+        for aid, (text, _, assessed, done) in list(pending.items()):
+            # only skills without a checkpointed assessment are (re-)batched
+            missing = [sk for sk in assessed if sk not in done]
+            if not missing:
+                with io_lock:
+                    _finish_row(aid)
+                continue
+            for b in range(0, len(missing), batch_size):
+                futs[ex.submit(_assess, text, missing[b:b + batch_size])] = (aid, b // batch_size)
+
+        for fut in concurrent.futures.as_completed(futs):
+            aid, b = futs[fut]
+            try:
+                objs = fut.result()
+            except Exception as e:
+                with io_lock:
+                    if aid not in failed:
+                        failed.add(aid)
+                        stats.add_row(failed=True)
+                        print(f"Extraction failed for {aid[:10]} (batch {b}): {type(e).__name__}: {e}")
+                continue
+            with io_lock:
+                ckpt.write(json.dumps({"id": aid, "objs": objs}) + "\n")
+                ckpt.flush()
+                _, _, assessed, done = pending[aid]
+                done.update({o["skill"]: o for o in objs})
+                if aid not in failed and all(sk in done for sk in assessed):
+                    _finish_row(aid)
+
+    # all rows written -> checkpoint no longer needed
+    if not pending and os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    return stats.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract ESCO transversal skills for new activity texts.")
+    parser.add_argument("input", help="CSV with activity texts")
+    parser.add_argument("output", help="CSV in dashboard format (appended, resumable)")
+    parser.add_argument("--text-column", default="X")
+    parser.add_argument("--label-column", default=None, help="optional column with ground-truth skill lists")
+    parser.add_argument("--batch-size", type=int, default=8, help="skills per model call")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel model calls")
+    parser.add_argument("--top-k", type=int, default=0,
+                        help="assess only the k skills closest to the activity in embedding space (0 = all)")
+    parser.add_argument("--max-tokens", type=int, default=4096)
+    parser.add_argument("--price-per-1k-tokens", type=float, default=0.0)
+    parser.add_argument("--gpu-hour-cost", type=float, default=0.0)
+    args = parser.parse_args()
+
+    from data import load_data_df, load_esco_skills
+
+    esco_skills = load_esco_skills(load_data_df())
+
+    df = pd.read_csv(args.input)
+    texts = df[args.text_column].astype(str).tolist()
+    labels = None
+    if args.label_column:
+        import ast
+        labels = [ast.literal_eval(v) if isinstance(v, str) else [] for v in df[args.label_column]]
+    candidates = None
+    if args.top_k:
+        from embeddings import skill_candidates
+        candidates = skill_candidates(texts, esco_skills, args.top_k)
+    stats = ExtractionStats(args.price_per_1k_tokens, args.gpu_hour_cost)
+    report = run_extraction(texts, args.output, esco_skills, labels=labels, candidates=candidates,
+                            batch_size=args.batch_size,
+                            concurrency=args.concurrency, max_tokens=args.max_tokens, stats=stats)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
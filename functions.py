@@ -1,310 +1,42 @@
-import textwrap
-from typing import Optional
-import plotly.graph_objects as go
-from plotly.colors import sample_colorscale
-import html
+import concurrent.futures
 import json
-from lm_studio_client import LMStudioClient
+import os
+import re
+import time
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import (Retrying, retry_if_exception_type, stop_after_attempt, stop_before_delay,
+                      wait_random_exponential)
+from lm_studio_client import (LMStudioClient, LMStudioPool, CircuitBreaker, CircuitOpenError,
+                              NoHealthyEndpointError)
+from lifecycle import BackendLifecycle
+# rendering helpers used to live here; re-exported for existing imports
+from rendering import (visualize_score, insert_highlights, insert_highlights_old, build_skill_table, pack_html,  # noqa: F401
+                       unpack_html, highlight_payload_sizes, _find_all_occurrences, _highlight_spans)
+
+# LLM call limits
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))     # seconds per request
+LLM_ATTEMPTS = int(os.environ.get("LLM_ATTEMPTS", 3))      # tries per job incl. the first one
+LLM_DEADLINE = float(os.environ.get("LLM_DEADLINE", 150))  # seconds per job over all tries
+LLM_FAST_MAX_TOKENS = int(os.environ.get("LLM_FAST_MAX_TOKENS", 1024))  # score-only call of the two-phase mode
+LLM_CHUNK_TOKENS = int(os.environ.get("LLM_CHUNK_TOKENS", 1024))  # longer activity texts are scored in parts (0 = never)
+LLM_CHUNK_CONCURRENCY = int(os.environ.get("LLM_CHUNK_CONCURRENCY", 4))  # parallel part calls per match
 
 # singelton LM Studio Client
-lm_studio_client = LMStudioClient(model="openai/gpt-oss-20b")
+# LMSTUDIO_BASE_URLS="http://gpu1:1234/v1,http://gpu2:8000/v1" -> pool with least-loaded routing
+_base_urls = [u.strip() for u in os.environ.get("LMSTUDIO_BASE_URLS", "").split(",") if u.strip()]
+if _base_urls:
+    lm_studio_client = LMStudioPool(_base_urls, model="openai/gpt-oss-20b", timeout=LLM_TIMEOUT)
+else:
+    lm_studio_client = LMStudioClient(model="openai/gpt-oss-20b", timeout=LLM_TIMEOUT)
 
+# shared by all sessions: once the backend is down, every job fails fast
+llm_breaker = CircuitBreaker()
 
-def visualize_score(
-        score: float,
-        title: Optional[str] = None,
-        explanation: Optional[str] = None,
-        steps: int = 50,
-        wrap: int = 80,
-) -> go.Figure:
-    """
-    0–100% tachometer (red→green) as Plotly gauge.
-    - score: 0–100, values are clamped.
-    - title: Title above the plot.
-    - explanation: Text below the plot (automatic line wrapping).
-    - steps: Number of background bands.
-    - wrap: Maximum characters per line for line wrapping.
-    Note: No fig.show() -> no double rendering in Jupyter.
-    """
-    s = max(0.0, min(100.0, float(score)))
-    cur_col = sample_colorscale("RdYlGn", s / 100.0)[0]
-
-    # Farbverlauf
-    step_ranges = []
-    for i in range(steps):
-        a = 100.0 * i / steps
-        b = 100.0 * (i + 1) / steps
-        c = sample_colorscale("RdYlGn", (i + 0.5) / steps)[0]
-        step_ranges.append({"range": [a, b], "color": c})
-
-    fig = go.Figure(
-        go.Indicator(
-            mode="gauge+number",
-            value=s,
-            number={"suffix": "%", "valueformat": ".1f"},
-            title={"text": title or ""},
-            gauge={
-                "axis": {"range": [0, 100], "tickvals": [0, 25, 50, 75, 100], "ticks": "outside"},
-                "bar": {"color": cur_col, "thickness": 0.25},
-                "borderwidth": 1,
-                "steps": step_ranges,
-                "threshold": {"line": {"color": cur_col, "width": 4}, "thickness": 0.85, "value": s},
-            },
-            domain={"x": [0, 1], "y": [0, 1]},
-        )
-    )
-
-    # Explanation grows downwards, line breaks via <br>
-    lines = 0
-    if explanation:
-        wrapped = textwrap.fill(str(explanation), width=wrap)
-        text = wrapped.replace("\n", "<br>")
-        # start underneath the gauge
-        fig.add_annotation(
-            x=0.5, xref="paper", xanchor="center",
-            y=0, yref="paper", yanchor="top", yshift=-8,
-            text=text, showarrow=False, align="center"
-        )
-        lines = text.count("<br>") + 1
-
-    # Layout: additional space below for explanation
-    base_bottom = 36  # base margin bottom
-    line_height = 18  # margin bottom per line
-    extra = max(0, lines) * line_height
-    fig.update_layout(
-        margin=dict(l=20, r=20, t=50 if title else 20, b=base_bottom + extra),
-        height=340 + int(extra * 0.6),
-    )
-
-    return fig
-
-
-def _find_all_occurrences(text: str, needle: str):
-    """
-    Finds all occurrences of the substring `needle` in the string `text`.
-
-    Returns a list of tuples, where each tuple contains the start and end indices
-    of an occurrence of `needle` in `text`. If `needle` is empty, returns an empty list.
-
-    Args:
-        text (str): The string to search in.
-        needle (str): The substring to search for.
-
-    Returns:
-        List[Tuple[int, int]]: List of (start, end) index pairs for each occurrence.
-    """
-    idxs, i, L = [], 0, len(needle)
-    if not needle:
-        return idxs
-    while True:
-        j = text.find(needle, i)
-        if j == -1:
-            break
-        idxs.append((j, j + L))
-        i = j + L
-    return idxs
-
-
-def _coverage_labels(text: str, spans_with_skills):
-    """
-    Returns a list of sets, one for each character in `text`, indicating which skills and reasons
-    cover each character position. Each set contains tuples of (skill, reason, span).
-
-    Args:
-        text (str): The text to analyze.
-        spans_with_skills (list): List of dicts with keys "span", "skill", "reason".
-
-    Returns:
-        List[Set[Tuple[str, str, str]]]: Coverage labels for each character position.
-    """
-    # Initialize coverage: one set per character in text
-    cov = [set() for _ in range(len(text))]
-    for entry in spans_with_skills:
-        span = entry.get("span")
-        skill = entry.get("skill")
-        reason = entry.get("reason")
-        # Skip if span or skill is missing
-        if not span or not skill:
-            continue
-        # Clean up span string
-        span = span.replace('"', '').strip()
-        # Skip if span is empty or too short
-        if not span or len(span) < 2:
-            continue
-        # Find all occurrences of the span in text
-        for s, e in _find_all_occurrences(text, span):
-            # Clamp indices to valid range
-            s = max(0, min(s, len(text)))
-            e = max(0, min(e, len(text)))
-            # Mark coverage for each character in the span
-            for i in range(s, e):
-                cov[i].add((skill, reason, span))
-    return cov
-
-
-def _segments_from_coverage(text: str, cov):
-    """
-    Splits the text into segments based on coverage labels.
-
-    Each segment is a tuple (start, end, labels), where 'labels' is the set of coverage labels
-    for that segment. Segments are created whenever the coverage labels change.
-
-    Args:
-        text (str): The input text.
-        cov (list): List of sets, one per character, indicating coverage labels.
-
-    Returns:
-        list: List of (start, end, labels) tuples for each segment.
-    """
-    if not text:
-        return []
-    if not cov:
-        return [(0, len(text), set())]
-    segments = []
-    prev_labels = cov[0]
-    start = 0
-    # Iterate through text, split at coverage label changes
-    for i in range(1, len(text)):
-        if cov[i] != prev_labels:
-            segments.append((start, i, prev_labels))
-            start = i
-            prev_labels = cov[i]
-    segments.append((start, len(text), prev_labels))
-    return segments
-
-
-def insert_highlights_old(text: str, spans_with_skills):
-    """
-    Inserts HTML highlights into the text for spans covered by skills and reasons.
-
-    Each segment of the text that is covered by one or more skills/reasons is wrapped in a
-    <span> and <mark> tag with a background color. A tooltip card is added for each segment,
-    showing the skill, reason, and span information.
-
-    Args:
-        text (str): The input text to highlight.
-        spans_with_skills (list): List of dicts with keys "span", "skill", "reason".
+# warm-up, keep-alive and readiness of the model; started by the app
+backend = BackendLifecycle(lm_studio_client, keepalive_interval=float(os.environ.get("LLM_KEEPALIVE", 300)))
 
-    Returns:
-        str: HTML string with highlights and tooltips.
-    """
-    cov = _coverage_labels(text, spans_with_skills)
-    segs = _segments_from_coverage(text, cov)
-
-    # Color palette for highlights
-    palette = [
-        "#fde68a", "#fca5a5", "#93c5fd", "#a7f3d0", "#c4b5fd",
-        "#f9a8d4", "#fdba74", "#86efac", "#fcd34d", "#fca5a5"
-    ]
-    combo2color = {}
-
-    parts = []
-    for s, e, labels in segs:
-        seg_txt_raw = text[s:e]
-        seg_txt = html.escape(seg_txt_raw)
-
-        # If no labels or segment is empty, just append the text
-        if not labels or seg_txt_raw.strip() == "":
-            parts.append(seg_txt)
-            continue
-
-        # Create a key for the combination of skills/reasons/spans
-        key = tuple(sorted((str(sk) or "", str(rs) or "", str(spa) or "") for (sk, rs, spa) in labels))
-        if key not in combo2color:
-            combo2color[key] = palette[len(combo2color) % len(palette)]
-        color = combo2color[key]
-
-        # Build tooltip card HTML
-        tip_rows = []
-        for sk, rs, spa in key:
-            tip_rows.append(
-                f'<div class="row">'
-                f'<div class="skill"><b>{html.escape(sk)}</b></div>'
-                f'<div class="reason"><strong>Reason</strong>:<br> {html.escape(rs)}</div>'
-                f'<div class="span"><strong>Span</strong>:<br> "{html.escape(spa)}"</div>'
-                f'<br>'
-                f'</div>'
-            )
-        tip_html = "".join(tip_rows)
-
-        # Wrap the segment in highlight and tooltip HTML
-        parts.append(
-            f'<span class="es-tooltip">'
-            f'<mark style="background:{color}">{seg_txt}</mark>'
-            f'<span class="es-card">{tip_html}</span>'
-            f'</span>'
-        )
-    return "".join(parts)
-
-
-def insert_highlights(text: str, spans_with_skills):
-    """
-    Inserts HTML highlights into the text for spans covered by skills and reasons.
-
-    Each segment of the text that is covered by one or more skills/reasons is wrapped in a
-    <span> and <mark> tag with a background color. A tooltip card is added for each segment,
-    showing the skill, reason, and span information.
-
-    Args:
-        text (str): The input text to highlight.
-        spans_with_skills (list): List of dicts with keys "span", "skill", "reason".
-
-    Returns:
-        str: HTML string with highlights and tooltips.
-    """
-    cov = _coverage_labels(text, spans_with_skills)
-    segs = _segments_from_coverage(text, cov)
-
-    # Color palette for highlights
-    palette = ["#fde68a", "#fca5a5", "#93c5fd", "#a7f3d0", "#c4b5fd",
-               "#f9a8d4", "#fdba74", "#86efac", "#fcd34d", "#fca5a5"]
-    combo2color = {}
-
-    parts = []
-    for s, e, labels in segs:
-        seg_txt_raw = text[s:e]
-        seg_txt = html.escape(seg_txt_raw)
-
-        # If no labels or segment is empty, just append the text
-        if not labels or seg_txt_raw.strip() == "":
-            parts.append(seg_txt)
-            continue
-
-        # Consistent color per combination of skills/reasons/spans
-        key = tuple(sorted((str(sk) or "", str(rs) or "", str(spa) or "") for (sk, rs, spa) in labels))
-        if key not in combo2color:
-            combo2color[key] = palette[len(combo2color) % len(palette)]
-        color = combo2color[key]
-
-        # Tooltip content: one .es-item per skill in the same span
-        items_html = []
-        for sk, rs, spa in key:
-            items_html.append(f"""
-    <div class="es-item">
-      <div class="es-skill">{html.escape(sk)}</div>
-      <div class="es-span">{html.escape(spa)}</div>
-      <details class="es-acc">
-        <summary>Reason</summary>
-        <div class="es-reason">{html.escape(rs)}</div>
-      </details>
-    </div>
-    """.strip())
-
-        tip_html = (
-                '<div class="es-tip">' +
-                "".join(items_html) +
-                '</div>'
-        )
-
-        # Wrap the segment in highlight and tooltip HTML
-        parts.append(
-            f'<div class="es-tooltip">'
-            f'  <mark style="background:{color}">{seg_txt}</mark>'
-            f'  <div class="es-card">{tip_html}</div>'
-            f'</div>'
-        )
-
-    return "".join(parts)
+# errors worth another try (APITimeoutError is an APIConnectionError)
+_TRANSIENT_ERRORS = (APIConnectionError, InternalServerError, RateLimitError, NoHealthyEndpointError)
 
 
 def _extract_json_payload(s):
@@ -342,7 +74,8 @@ def _build_prompt(
         person_skills: list,
         goal: str,
         interests: str,
-        person_idx: int = 0
+        person_idx: int = 0,
+        detailed: bool = True
 ) -> str:
     """
     Builds a prompt for skill/activity assessment.
@@ -354,6 +87,8 @@ def _build_prompt(
         goal (str): The user's goal.
         interests (str): The user's interests.
         person_idx (int, optional): Index of the person (default: 0).
+        detailed (bool, optional): Also ask for the long markdown explanation. Without it the
+            response is much shorter; see _build_explanation_prompt() for generating it later.
 
     Returns:
         str: The formatted prompt string for the language model.
@@ -363,6 +98,14 @@ def _build_prompt(
     optional_list = ", ".join([d['skill'] for d in detailed_objs if d.get('optional')])
     train_list = ", ".join([d['skill'] for d in detailed_objs if d.get('trainable')])
 
+    if detailed:
+        response = '{"score":0.0,"explanation":"","explanation_short":"","recommend":false}'
+        expl_field = f"""
+- explanation: A detailed text (styled nicely with markdown) explaining the reasoning behind the score, mentioning specific skills, goals, interests and spans from the activity text that match or are missing."""
+    else:
+        response = '{"score":0.0,"explanation_short":"","recommend":false}'
+        expl_field = ""
+
     # Build the prompt string with all relevant information and instructions
     return f"""
 Person {person_idx + 1} has the following skills: {', '.join(person_skills)}.
@@ -386,11 +129,10 @@ Trainable Skills:
 {train_list}
 
 Response (JSON):
-{{"score":0.0,"explanation":"","explanation_short":"","recommend":false}}
+{response}
 
 Explanation of Response Fields:
-- score: A float value between 0.0 and 1.0 indicating how well Person {person_idx + 1} matches the needed skills for the activity. 1.0 means perfect match, 0.0 means no match.
-- explanation: A detailed text (styled nicely with markdown) explaining the reasoning behind the score, mentioning specific skills, goals, interests and spans from the activity text that match or are missing.
+- score: A float value between 0.0 and 1.0 indicating how well Person {person_idx + 1} matches the needed skills for the activity. 1.0 means perfect match, 0.0 means no match.{expl_field}
 - explanation_short: A meaningful one-sentence summary of the explanation. Another sentence mentioning the user's goal and if the activity fits to it would be good. Another sentence mentioning the user's interests and if the activity fits to them. (Example: Strong match (score: 0.86) - the person has the ... skills needed for the ... activity. \n ### Goal Fit: The activity aligns well with the user's goal of ... . \n ### Interest Fit: The activity matches the user's interests in ... .)
 - recommend: A boolean value indicating whether Person {person_idx + 1} is recommended for the activity based on the score and explanation.
 
@@ -399,12 +141,264 @@ Style the explanations nicely with markdown, using headings, bullet points, and
 IMPORTANT: ALWAYS RESPOND IN THE EXACT JSON FORMAT.
 
 Response (JSON):
-{{"score":0.0,"explanation":"","explanation_short":"","recommend":false}}
+{response}
 
 """.strip()
 
 
-def _worker(x_text, detailed_objs, person_skills, goal, interests, person_idx=0):
+def _build_explanation_prompt(
+        x_text: str,
+        detailed_objs: list,
+        person_skills: list,
+        goal: str,
+        interests: str,
+        person_idx: int,
+        score: float,
+        expl_short: str
+) -> str:
+    """
+    Builds the prompt for the long explanation of an already scored match (second phase of the
+    two-phase mode). Shares the prefix of _build_prompt(), so the server can reuse its prompt cache.
+
+    Args:
+        x_text (str): The activity text.
+        detailed_objs (list): List of skill dicts.
+        person_skills (list): List of skills the person has.
+        goal (str): The user's goal.
+        interests (str): The user's interests.
+        person_idx (int): Index of the person.
+        score (float): Score of the first phase (0.0 to 1.0).
+        expl_short (str): Short explanation of the first phase.
+
+    Returns:
+        str: The formatted prompt string for the language model.
+    """
+    base = _build_prompt(x_text, detailed_objs, person_skills, goal, interests, person_idx, detailed=False)
+    # keep everything up to the response format, the task changes from scoring to explaining
+    base = base.split("Response (JSON):", 1)[0].rstrip()
+    return f"""
+{base}
+
+The match was already assessed with a score of {score:.2f}:
+{expl_short}
+
+Task:
+Write a detailed explanation of this assessment, mentioning specific skills, goals, interests and spans from the activity text that match or are missing.
+Style it nicely with markdown, using headings, bullet points, and bold text where appropriate.
+Respond with the markdown text only.
+""".strip()
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    Rough token count of `text` (about 4 characters per token for English text).
+    """
+    return len(text) // 4 + 1
+
+
+# sentence end followed by whitespace, or line breaks
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _sentence_bounds(text: str):
+    """
+    (start, end) of each sentence of `text`, trailing whitespace included.
+    """
+    bounds, start = [], 0
+    for m in _SENTENCE_BREAK.finditer(text):
+        if m.start() > start:
+            bounds.append((start, m.end()))
+        start = m.end()
+    if start < len(text):
+        bounds.append((start, len(text)))
+    return bounds
+
+
+def _span_occurrences(text: str, detailed_objs):
+    """
+    (start, end, obj) for every occurrence of a highlighted span of `detailed_objs` in `text`.
+    """
+    occ = []
+    for d in _highlight_spans(detailed_objs):
+        span = str(d["span"]).replace('"', '').strip()
+        if len(span) >= 2:
+            occ.extend((s, e, d) for s, e in _find_all_occurrences(text, span))
+    return occ
+
+
+def _chunk_text(text: str, detailed_objs, max_tokens: int):
+    """
+    Splits `text` on sentence boundaries into chunks of about `max_tokens` tokens.
+
+    Sentences joined by a skill span are kept in the same chunk, so every span stays next to
+    its context. Only a single sentence longer than `max_tokens` without any span is cut at
+    whitespace.
+
+    Args:
+        text (str): The activity text.
+        detailed_objs (list): y_pred_detailed of the activity.
+        max_tokens (int): Token budget per chunk.
+
+    Returns:
+        list: Tuples (chunk_text, evidence) with evidence as list of (skill, span) in the chunk.
+    """
+    occ = _span_occurrences(text, detailed_objs)
+    # merge sentences a span crosses into one unit
+    units = []
+    for s, e in _sentence_bounds(text):
+        if units and any(os_ < s < oe for os_, oe, _ in occ):
+            units[-1] = (units[-1][0], e)
+        else:
+            units.append((s, e))
+
+    # cut oversized units without spans at whitespace
+    max_chars = max(1, max_tokens * 4)
+    pieces = []
+    for s, e in units:
+        if _estimate_tokens(text[s:e]) <= max_tokens or any(s <= os_ < e for os_, _, _ in occ):
+            pieces.append((s, e))
+            continue
+        while s < e:
+            cut = min(e, s + max_chars)
+            if cut < e:
+                ws = text.rfind(" ", s + 1, cut)
+                cut = ws + 1 if ws > s else cut
+            pieces.append((s, cut))
+            s = cut
+
+    # greedy packing
+    chunks = []
+    for s, e in pieces:
+        if chunks and _estimate_tokens(text[chunks[-1][0]:e]) <= max_tokens:
+            chunks[-1] = (chunks[-1][0], e)
+        else:
+            chunks.append((s, e))
+
+    out = []
+    for s, e in chunks:
+        evidence, seen = [], set()
+        for os_, oe, d in occ:
+            key = (d["skill"], os_)
+            if s <= os_ and oe <= e and key not in seen:
+                seen.add(key)
+                evidence.append((d["skill"], text[os_:oe]))
+        out.append((text[s:e].strip(), evidence))
+    return out
+
+
+def _build_chunk_prompt(chunk: str, evidence: list, part: int, n_parts: int, detailed_objs: list,
+                        person_skills: list, goal: str, interests: str, person_idx: int) -> str:
+    """
+    Scoring prompt for one part of a long activity text (map step). Same format as the score-only
+    _build_prompt(), with the skill spans found in this part.
+    """
+    base = _build_prompt(chunk, detailed_objs, person_skills, goal, interests, person_idx, detailed=False)
+    ev_lines = "\n".join(f'- {sk}: "{span}"' for sk, span in evidence) or "- none"
+    return base.replace(
+        f"Activity Text:\n{chunk}\n",
+        f"Activity Text (part {part} of {n_parts}, assess based on this part only):\n{chunk}\n\n"
+        f"Skill Evidence in this Part:\n{ev_lines}\n",
+        1,
+    )
+
+
+def _parts_text(parts: list) -> str:
+    """
+    Replacement for the activity text in the reduce and explanation prompts of a long text.
+    """
+    lines = [f"(The activity text is too long for one assessment. It was assessed in {len(parts)} parts:)"]
+    for i, p in enumerate(parts):
+        lines.append(f"Part {i + 1} (score {p['score']:.2f}): {p['expl_short']}")
+        if p.get("evidence"):
+            lines.append("  Evidence: " + "; ".join(f'{sk}: "{span}"' for sk, span in p["evidence"]))
+    return "\n".join(lines)
+
+
+def _chat_with_retry(messages, deadline=None, **kwargs):
+    """
+    Calls the LM Studio client with jittered exponential backoff on transient errors.
+
+    LLM_DEADLINE bounds the whole call: no try starts if its backoff would end after the
+    deadline, and every try gets at most the remaining time as request timeout. Calls that
+    belong to one job (e.g. the parts of a long text) share the job's `deadline` instead.
+    Every try passes through the circuit breaker; once it is open the call raises
+    CircuitOpenError immediately and is not retried.
+
+    Args:
+        messages (list): List of message dicts for the conversation.
+        deadline (float, optional): time.monotonic() by which the call must end
+            (default: LLM_DEADLINE from now).
+        **kwargs: Passed on to the client's chat().
+
+    Returns:
+        str: The content of the model's response message.
+
+    Raises:
+        TimeoutError: If the deadline has passed before the first try.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + LLM_DEADLINE
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("LLM_DEADLINE exceeded")
+    for attempt in Retrying(retry=retry_if_exception_type(_TRANSIENT_ERRORS),
+                            stop=stop_after_attempt(LLM_ATTEMPTS) | stop_before_delay(remaining),
+                            wait=wait_random_exponential(multiplier=1, max=20),
+                            reraise=True):
+        with attempt:
+            timeout = max(0.0, min(LLM_TIMEOUT, deadline - time.monotonic()))
+            return _chat_once(messages, timeout=timeout, **kwargs)
+
+
+def _chat_once(messages, **kwargs):
+    """
+    One try of _chat_with_retry() through the circuit breaker.
+    """
+    llm_breaker.before_call()
+    try:
+        raw = lm_studio_client.chat(messages, **kwargs)
+    except _TRANSIENT_ERRORS as e:
+        llm_breaker.record_failure()
+        # a timeout means slow, not down, and 429 / NoHealthyEndpointError come from a server that
+        # answers; only failed connections ask the lifecycle to probe the backend
+        if isinstance(e, APIConnectionError) and not isinstance(e, APITimeoutError):
+            backend.report_failure(e)
+        raise
+    except Exception:
+        # the backend answered, only the request was rejected
+        llm_breaker.record_success()
+        raise
+    llm_breaker.record_success()
+    backend.touch()
+    return raw
+
+
+def _warmup_messages(persons, goal, interests):
+    """
+    Warm-up prompts with the person-specific prefix of _build_prompt() (everything before the
+    activity text), so the server's prompt cache already holds it for the first real job.
+    Person 1 comes last because it is selected when the dashboard opens.
+
+    Args:
+        persons (list): Skill lists of the persons.
+        goal (str): Default goal.
+        interests (str): Default interests.
+
+    Returns:
+        list: One message list per person.
+    """
+    return [[{"role": "user", "content": _build_prompt("", [], skills, goal, interests, i)}]
+            for i, skills in reversed(list(enumerate(persons)))]
+
+
+def _failed_result(msg):
+    """
+    Result dict of a job that did not produce a score. Must not be cached.
+    """
+    return {"score": 0.0, "expl": msg, "expl_short": "", "failed": True}
+
+
+def _worker(x_text, detailed_objs, person_skills, goal, interests, person_idx=0, detailed=True):
     """
     Calls the language model to assess if a person can perform an activity based on their skills, goal, and interests.
 
@@ -415,24 +409,99 @@ def _worker(x_text, detailed_objs, person_skills, goal, interests, person_idx=0)
         goal (str): The user's goal.
         interests (str): The user's interests.
         person_idx (int, optional): Index of the person (default: 0).
+        detailed (bool, optional): Also generate the long explanation. If False, only score and
+            short explanation are requested with at most LLM_FAST_MAX_TOKENS tokens and 'expl' is
+            None; generate it later with _explanation_worker().
 
     Returns:
-        dict: Contains 'score', 'expl' (explanation), and 'expl_short' (short explanation).
+        dict: Contains 'score', 'expl' (explanation), 'expl_short' (short explanation) and
+        'failed'. Failed results carry the error message in 'expl' and must not be cached.
+    """
+    if LLM_CHUNK_TOKENS and _estimate_tokens(x_text) > LLM_CHUNK_TOKENS:
+        return _map_reduce_worker(x_text, detailed_objs, person_skills, goal, interests, person_idx, detailed)
+    # Build prompt for the language model
+    prompt = _build_prompt(x_text, detailed_objs, person_skills, goal, interests, person_idx, detailed)
+    return _score_call(prompt, detailed)
+
+
+def _score_call(prompt, detailed=True, deadline=None):
+    """
+    Sends a scoring prompt and parses the response into a result dict (see _worker()).
+    `deadline` is passed on to _chat_with_retry().
     """
     try:
-        # Build prompt for the language model
-        prompt = _build_prompt(x_text, detailed_objs, person_skills, goal, interests, person_idx)
         # Call LM Studio model
-        raw = lm_studio_client.chat([{"role": "user", "content": prompt}], temperature=0)
-        # Extract JSON payload from model response
-        payload = _extract_json_payload(raw)
+        limits = {} if detailed else {"max_tokens": LLM_FAST_MAX_TOKENS}
+        raw = _chat_with_retry([{"role": "user", "content": prompt}], deadline=deadline, temperature=0, **limits)
+    except CircuitOpenError as e:
+        return _failed_result(str(e))
+    except Exception as e:
+        return _failed_result(f"Model call failed ({type(e).__name__})")
+    # Extract JSON payload from model response
+    payload = _extract_json_payload(raw)
+    try:
         # Clamp score between 0.0 and 1.0
-        score = max(0.0, min(1.0, float(payload.get("score", 0.0))))
-        # Get explanation and short explanation
-        expl = str(payload.get("explanation", "")) or "No explanation"
-        expl_short = str(payload.get("explanation_short", "")) or ""
-    except Exception:
-        # Fallback values if model call fails
-        score, expl, expl_short = 0.0, "Model call failed", ""
-    return {"score": score, "expl": expl, "expl_short": expl_short}
+        score = max(0.0, min(1.0, float(payload["score"])))
+    except (KeyError, TypeError, ValueError):
+        return _failed_result("Model response could not be parsed")
+    # Get explanation and short explanation
+    expl = (str(payload.get("explanation", "")) or "No explanation") if detailed else None
+    expl_short = str(payload.get("explanation_short", "")) or ""
+    return {"score": score, "expl": expl, "expl_short": expl_short, "failed": False}
+
+
+def _map_reduce_worker(x_text, detailed_objs, person_skills, goal, interests, person_idx=0, detailed=True):
+    """
+    Scores an activity text longer than LLM_CHUNK_TOKENS: its parts are scored in parallel
+    (map, score-only prompts) and a final call merges the part assessments (reduce). All calls
+    share one LLM_DEADLINE, like the tries of a single call.
+
+    Returns:
+        dict: Like _worker(), plus 'parts' (score, short explanation and evidence per part).
+        If any part fails, the match fails (and is not cached) instead of being scored on a
+        partial text.
+    """
+    deadline = time.monotonic() + LLM_DEADLINE
+    chunks = _chunk_text(x_text, detailed_objs, LLM_CHUNK_TOKENS)
+    prompts = [_build_chunk_prompt(c, ev, i + 1, len(chunks), detailed_objs, person_skills, goal, interests,
+                                   person_idx) for i, (c, ev) in enumerate(chunks)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, LLM_CHUNK_CONCURRENCY)) as ex:
+        results = list(ex.map(lambda p: _score_call(p, detailed=False, deadline=deadline), prompts))
+    failed = [i + 1 for i, r in enumerate(results) if r["failed"]]
+    if failed:
+        first = results[failed[0] - 1]
+        return _failed_result(f"Part {failed[0]} of {len(chunks)} failed: {first['expl']}")
+    parts = [{"score": r["score"], "expl_short": r["expl_short"], "evidence": ev}
+             for r, (_, ev) in zip(results, chunks)]
+    prompt = _build_prompt(_parts_text(parts), detailed_objs, person_skills, goal, interests, person_idx, detailed)
+    res = _score_call(prompt, detailed, deadline)
+    if not res["failed"]:
+        res["parts"] = parts
+    return res
+
+
+def _explanation_worker(x_text, detailed_objs, person_skills, goal, interests, person_idx, score, expl_short,
+                        parts=None):
+    """
+    Generates the long explanation of a match scored by _worker(detailed=False). For long texts
+    scored in parts, the part assessments (`parts` of the result) replace the activity text.
+
+    Returns:
+        dict: Contains 'expl' and 'failed'. Failed results carry the error message in 'expl'
+        and must not be cached.
+    """
+    if parts:
+        x_text = _parts_text(parts)
+    try:
+        prompt = _build_explanation_prompt(x_text, detailed_objs, person_skills, goal, interests, person_idx,
+                                           score, expl_short)
+        raw = _chat_with_retry([{"role": "user", "content": prompt}], temperature=0)
+    except CircuitOpenError as e:
+        return {"expl": str(e), "failed": True}
+    except Exception as e:
+        return {"expl": f"Model call failed ({type(e).__name__})", "failed": True}
+    expl = str(raw or "").strip()
+    if not expl:
+        return {"expl": "Model returned no explanation", "failed": True}
+    return {"expl": expl, "failed": False}
 
@@ -0,0 +1,321 @@
+import concurrent.futures
+import functools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+# all live registries of this process (for process_gauge)
+_registries = weakref.WeakSet()
+
+
+class ResultStore:
+    def __init__(self, max_items=10000):
+        """
+        Process-wide LRU store for completed job results, shared by all sessions.
+
+        Args:
+            max_items (int): Maximum number of stored results.
+        """
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the stored result for `key` or None.
+        """
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, result):
+        """
+        Stores `result` under `key`, evicting the least recently used entries.
+        """
+        with self._lock:
+            self._items[key] = result
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _spill(result_store, job_key, fut):
+    # done callback: must not reference the registry, otherwise queued jobs keep it alive
+    if result_store is None or fut.cancelled() or fut.exception() is not None:
+        return
+    result = fut.result()
+    # failed results are never cached
+    if not (isinstance(result, dict) and result.get("failed")):
+        result_store.put(job_key, result)
+
+
+def _shutdown_executor(executor):
+    # must not reference the registry, otherwise it is never collected
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+class JobRegistry:
+    def __init__(self, max_jobs=64, max_workers=1, result_store=None):
+        """
+        Per-session registry of LLM jobs with LRU eviction.
+
+        Holds the futures of a session together with their poll count and last displayed score.
+        Every successful result is put into the shared `result_store` as soon as its job
+        finishes, so other sessions and later sessions reuse it. When more than `max_jobs` jobs
+        are registered, the least recently used ones are evicted: finished jobs are dropped,
+        queued jobs are cancelled and running jobs are kept until they finish. The executor is shut down as soon as the
+        registry is garbage collected, i.e. when its Streamlit session ends.
+
+        Args:
+            max_jobs (int): Maximum number of jobs kept in the session.
+            max_workers (int): Worker threads of the session executor.
+            result_store (ResultStore, optional): Shared store for finished results.
+        """
+        self.max_jobs = max_jobs
+        self.result_store = result_store
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._jobs = OrderedDict()  # {job_key: {"future": Future, "last_score": float}}
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, _shutdown_executor, self.executor)
+        _registries.add(self)
+
+    def get(self, job_key):
+        """
+        Returns the future for `job_key` (marking it as recently used), falling back to the
+        result store. Returns None if the job is unknown.
+        """
+        with self._lock:
+            entry = self._jobs.get(job_key)
+            if entry is not None:
+                self._jobs.move_to_end(job_key)
+                return entry["future"]
+        if self.result_store is not None:
+            result = self.result_store.get(job_key)
+            if result is not None:
+                fut = concurrent.futures.Future()
+                fut.set_result(result)
+                self._add(job_key, fut)
+                return fut
+        return None
+
+    def submit(self, job_key, fn, *args, **kwargs):
+        """
+        Returns the existing future for `job_key` or submits `fn(*args, **kwargs)`.
+        """
+        fut = self.get(job_key)
+        if fut is None:
+            fut = self.executor.submit(fn, *args, **kwargs)
+            fut.add_done_callback(functools.partial(_spill, self.result_store, job_key))
+            self._add(job_key, fut)
+        return fut
+
+    def adopt(self, job_key, fut):
+        """
+        Tracks a future started elsewhere (e.g. a running IdleQueue task) under `job_key`, so the
+        session polls it instead of submitting the same work again.
+        """
+        self._add(job_key, fut)
+        return fut
+
+    def _add(self, job_key, fut):
+        with self._lock:
+            self._jobs[job_key] = {"future": fut, "last_score": 0.0}
+            self._jobs.move_to_end(job_key)
+            self._evict()
+
+    def _evict(self):
+        # caller holds self._lock
+        for key in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            fut = self._jobs[key]["future"]
+            # finished results are already in the result store (see _spill)
+            if not fut.done() and not fut.cancel():
+                continue  # running -> keep until done
+            del self._jobs[key]
+
+    def discard(self, job_key):
+        """
+        Removes a job without spilling its result (e.g. a failed result).
+        """
+        with self._lock:
+            entry = self._jobs.pop(job_key, None)
+        if entry is not None:
+            entry["future"].cancel()
+
+    def clear(self):
+        """
+        Cancels queued jobs and forgets all jobs of the session.
+        """
+        with self._lock:
+            entries, self._jobs = list(self._jobs.values()), OrderedDict()
+        for entry in entries:
+            entry["future"].cancel()
+
+    def last_score(self, job_key):
+        """
+        Returns the last displayed score (0..100) of `job_key`.
+        """
+        with self._lock:
+            entry = self._jobs.get(job_key)
+            return entry["last_score"] if entry is not None else 0.0
+
+    def set_last_score(self, job_key, score):
+        """
+        Remembers the displayed score (0..100) of `job_key` as start value of the next gauge animation.
+        """
+        with self._lock:
+            entry = self._jobs.get(job_key)
+            if entry is not None:
+                entry["last_score"] = score
+
+    def stats(self):
+        """
+        Returns job counts of this registry.
+
+        Returns:
+            dict: Keys 'jobs', 'running' and 'queued'.
+        """
+        with self._lock:
+            futures = [e["future"] for e in self._jobs.values()]
+        running = sum(1 for f in futures if f.running())
+        queued = sum(1 for f in futures if not f.done() and not f.running())
+        return {"jobs": len(futures), "running": running, "queued": queued}
+
+    def close(self):
+        """
+        Cancels queued jobs and shuts the executor down.
+        """
+        self.clear()
+        self._finalizer()
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+class IdleQueue:
+    def __init__(self, result_store, max_pending=32, idle_wait=1.0):
+        """
+        Process-wide low-priority queue for background work (e.g. prefetching results a user may
+        open later). A single thread runs one task at a time and only starts one while no session
+        has a running or queued job. A task that already runs is not interrupted, so an interactive
+        job submitted meanwhile shares the backend with it until it ends; claim() hands the running
+        task's future to a session that needs the same result. The most recently enqueued task
+        runs first; tasks beyond `max_pending` are dropped oldest first. Results are put into
+        `result_store`, where JobRegistry.get() finds them.
+
+        Args:
+            result_store (ResultStore): Store for finished results.
+            max_pending (int): Maximum number of waiting tasks.
+            idle_wait (float): Seconds between checks while sessions are busy.
+        """
+        self.result_store = result_store
+        self.max_pending = max_pending
+        self.idle_wait = idle_wait
+        self._pending = OrderedDict()  # {key: (fn, args, kwargs)}
+        self._running = None           # (key, Future) of the task in progress
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def enqueue(self, key, fn, *args, **kwargs):
+        """
+        Schedules `fn(*args, **kwargs)` for `key` unless its result is already stored or pending.
+        """
+        if self.result_store.get(key) is not None:
+            return
+        with self._cond:
+            if self._running is not None and self._running[0] == key:
+                return
+            if key in self._pending:
+                self._pending.move_to_end(key)
+                return
+            self._pending[key] = (fn, args, kwargs)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+            self._cond.notify()
+        self._start()
+
+    def claim(self, key):
+        """
+        Takes `key` over for an interactive request.
+
+        Returns:
+            Future or None: The future of the task if it is running right now (use it instead of
+            starting the same work again); otherwise None, and a waiting task is removed.
+        """
+        with self._cond:
+            if self._running is not None and self._running[0] == key:
+                return self._running[1]
+            self._pending.pop(key, None)
+        return None
+
+    def discard(self, key):
+        """
+        Removes a waiting task (e.g. because the result is now computed on demand).
+        """
+        with self._cond:
+            self._pending.pop(key, None)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="idle-queue", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            gauge = process_gauge()
+            if gauge["running"] or gauge["queued"]:
+                time.sleep(self.idle_wait)
+                continue
+            with self._cond:
+                if not self._pending:
+                    continue
+                key, (fn, args, kwargs) = self._pending.popitem(last=True)
+                if self.result_store.get(key) is not None:
+                    continue
+                fut = concurrent.futures.Future()
+                fut.set_running_or_notify_cancel()
+                self._running = (key, fut)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Background task {key} failed: {type(e).__name__}: {e}")
+                fut.set_exception(e)
+            else:
+                # failed results are never cached
+                if not (isinstance(result, dict) and result.get("failed")):
+                    self.result_store.put(key, result)
+                fut.set_result(result)
+            finally:
+                with self._cond:
+                    self._running = None
+
+
+def process_gauge():
+    """
+    Reports live sessions, jobs and threads of the current process.
+
+    Returns:
+        dict: Keys 'sessions', 'jobs', 'running', 'queued' and 'threads'.
+    """
+    gauge = {"sessions": 0, "jobs": 0, "running": 0, "queued": 0}
+    for reg in list(_registries):
+        gauge["sessions"] += 1
+        for k, v in reg.stats().items():
+            gauge[k] += v
+    gauge["threads"] = threading.active_count()
+    return gauge
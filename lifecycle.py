@@ -0,0 +1,244 @@
+# lifecycle.py
+# Keeps the inference backend warm and tells the dashboard whether jobs can run right now.
+import threading
+import time
+from openai import APITimeoutError
+
+# readiness states, in the order a healthy start goes through them
+STARTING = "starting"        # not probed yet
+UNREACHABLE = "unreachable"  # /v1/models failed
+MISSING = "missing"          # server up, model not listed
+WARMING = "warming"          # warm-up completion running (model may be loading)
+READY = "ready"
+
+_STATE_TEXT = {
+    STARTING: "Verbinde mit dem LLM-Backend...",
+    UNREACHABLE: "LLM-Backend nicht erreichbar.",
+    MISSING: "Modell {model} ist auf dem Server nicht verfügbar.",
+    WARMING: "Modell {model} wird geladen...",
+    READY: "Modell {model} bereit.",
+}
+
+
+class BackendLifecycle:
+    def __init__(self, client, warmup_messages=None, keepalive_interval=300.0, probe_interval=10.0):
+        """
+        Lifecycle of the model behind an LMStudioClient or LMStudioPool.
+
+        A background thread checks via /v1/models whether the model is available, then sends a
+        warm-up completion (which makes LM Studio load the model and fills the server's prompt
+        cache with the shared prompt prefix) and afterwards keeps the model loaded with small
+        keep-alive completions whenever no real request was made for `keepalive_interval` seconds.
+        `state` tells the dashboard whether submitted jobs would run or stall.
+
+        A pool routes every request to a single endpoint, so warm-up and keep-alive address each
+        healthy endpoint serving the model directly. The model counts as ready once one endpoint
+        is warm; endpoints that come up later are warmed up on the following checks.
+
+        Args:
+            client (LMStudioClient or LMStudioPool): Client with the model set.
+            warmup_messages (list, optional): Message lists sent once the model is listed, in order,
+                e.g. prompts sharing the prefix of the real requests. Default: a one-word prompt.
+            keepalive_interval (float): Idle seconds until a keep-alive request is sent (0 disables).
+            probe_interval (float): Seconds between checks of the background thread.
+        """
+        self.client = client
+        self.warmup_messages = warmup_messages or [[{"role": "user", "content": "Hi"}]]
+        self.keepalive_interval = keepalive_interval
+        self.probe_interval = probe_interval
+        self.state = STARTING
+        self.error = None         # last error message, shown while not ready
+        self.ready_since = None
+        self.last_request = None  # monotonic time of the last successful request
+        self._warm = set()        # clients (endpoints of a pool) that finished the warm-up
+        self._recheck = False     # a request failed to connect: probe on the next check
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def status_text(self):
+        """
+        Human-readable readiness for the dashboard.
+        """
+        text = _STATE_TEXT[self.state].format(model=self.client.model)
+        if self.error and self.state != READY:
+            text += f" ({self.error})"
+        endpoints = getattr(self.client, "endpoints", None)
+        if endpoints is not None and self.state == READY:
+            text += f" ({len(self._warm)}/{len(endpoints)} Endpunkte)"
+        return text
+
+    def set_warmup_messages(self, warmup_messages):
+        """
+        Replaces the warm-up prompts; used by the next warm-up.
+        """
+        self.warmup_messages = warmup_messages
+
+    def touch(self):
+        """
+        Records a successful request, which postpones the next keep-alive.
+        """
+        with self._lock:
+            self.last_request = time.monotonic()
+
+    def report_failure(self, error):
+        """
+        Records a request that could not connect. The backend stays ready until the probe, which
+        runs right away, finds it unreachable; a single failing request (or pool endpoint) does
+        not stop new jobs in every session.
+        """
+        with self._lock:
+            self.error = type(error).__name__
+            self._recheck = True
+        self._wake.set()
+
+    def check(self):
+        """
+        Runs one lifecycle step: probe and warm up while not ready; while ready, warm up endpoints
+        that became usable since and send keep-alives.
+
+        Returns:
+            str: The new state.
+        """
+        if self.state != READY:
+            self._probe_and_warm_up()
+            return self.state
+        if self._recheck:
+            self._recheck = False
+            if not self._probe():
+                return self.state
+        targets = self._targets()
+        with self._lock:
+            self._warm.intersection_update(targets)  # forget endpoints the pool ejected
+        cold = [c for c in targets if c not in self._warm]
+        if cold:
+            timed_out, error = self._warm_up(cold)
+            if not self._warm:
+                if timed_out:
+                    self._set(WARMING, "Timeout")
+                else:
+                    self._set(UNREACHABLE, error)
+                return self.state
+        if self.keepalive_interval and self._idle() >= self.keepalive_interval:
+            self._keepalive()
+        return self.state
+
+    def _targets(self):
+        # clients to warm up and keep alive: the client itself or the usable endpoints of a pool
+        endpoints = getattr(self.client, "endpoints", None)
+        if endpoints is None:
+            return [self.client]
+        return [ep.client for ep in endpoints if ep.healthy and ep.serves(self.client.model)]
+
+    def _idle(self):
+        with self._lock:
+            last = self.last_request if self.last_request is not None else self.ready_since
+        return time.monotonic() - last if last is not None else 0.0
+
+    def _set(self, state, error=None):
+        with self._lock:
+            self.state, self.error = state, error
+            if state == READY:
+                self.ready_since = time.monotonic()
+
+    def _probe(self):
+        """
+        Checks via /v1/models (a pool probes all endpoints) that the model is available.
+
+        Returns:
+            bool: True if it is; otherwise the state is set to UNREACHABLE or MISSING.
+        """
+        try:
+            models = self.client.list_models()
+        except Exception as e:
+            self._set(UNREACHABLE, type(e).__name__)
+            return False
+        # LM Studio lists downloaded models, loading happens on the first completion (JIT)
+        if models and self.client.model not in models:
+            self._set(MISSING)
+            return False
+        return True
+
+    def _probe_and_warm_up(self):
+        if not self._probe():
+            return
+        self._set(WARMING)
+        with self._lock:
+            self._warm.clear()
+        timed_out, error = self._warm_up(self._targets())
+        if self._warm:
+            self.touch()
+            self._set(READY)
+        elif timed_out:
+            # expected while the model loads; the server keeps loading, retried on the next check
+            self._set(WARMING, "Timeout")
+        else:
+            self._set(UNREACHABLE, error)
+
+    def _warm_up(self, targets):
+        """
+        Sends the warm-up prompts to every client in `targets`.
+
+        Returns:
+            tuple: (whether a warm-up timed out, name of the last other error or None)
+        """
+        timed_out, error = False, None
+        for client in targets:
+            try:
+                for messages in self.warmup_messages:
+                    client.chat(messages, temperature=0, max_tokens=1)
+            except APITimeoutError:
+                timed_out = True
+                continue
+            except Exception as e:
+                error = type(e).__name__
+                continue
+            with self._lock:
+                self._warm.add(client)
+        return timed_out, error
+
+    def _keepalive(self):
+        error = None
+        for client in [c for c in self._targets() if c in self._warm]:
+            try:
+                client.chat([{"role": "user", "content": "Hi"}], temperature=0, max_tokens=1)
+            except Exception as e:
+                error = type(e).__name__
+                with self._lock:
+                    self._warm.discard(client)
+        if not self._warm:
+            self._set(UNREACHABLE, error)
+            return
+        self.touch()
+
+    def start(self):
+        """
+        Starts the background thread (no-op if it is already running).
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def _loop():
+            while not self._stop.is_set():
+                try:
+                    self.check()
+                except Exception as e:
+                    print(f"Backend lifecycle check failed: {type(e).__name__}: {e}")
+                self._wake.wait(self.probe_interval)
+                self._wake.clear()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=_loop, name="llm-lifecycle", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread.
+        """
+        self._stop.set()
+        self._wake.set()
@@ -1,8 +1,77 @@
-from openai import OpenAI
+import threading
+import time
+from openai import OpenAI, APIConnectionError, APITimeoutError, InternalServerError
+
+
+class NoHealthyEndpointError(RuntimeError):
+    """
+    Raised by LMStudioPool when no healthy endpoint serves the requested model.
+    """
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised by CircuitBreaker while the backend is considered down.
+    """
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        """
+        Fails fast after repeated backend failures instead of letting every call wait for its timeout.
+
+        closed -> open after `failure_threshold` consecutive failures; open -> half-open after
+        `reset_timeout` seconds, where a single trial call decides between closed and open.
+
+        Args:
+            failure_threshold (int): Consecutive failures until the circuit opens.
+            reset_timeout (float): Seconds the circuit stays open before a trial call is allowed.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_call(self):
+        """
+        Checks whether a call may pass.
+
+        Raises:
+            CircuitOpenError: If the circuit is open or a half-open trial call is already running.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self._trial:
+                raise CircuitOpenError(f"LLM-Backend nicht erreichbar, nächster Versuch in {max(0, remaining):.0f}s.")
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures, self.opened_at, self._trial = 0, None, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
 
 
 class LMStudioClient:
-    def __init__(self, base_url="http://localhost:1234/v1", api_key="lm-studio", model=None):
+    def __init__(self, base_url="http://localhost:1234/v1", api_key="lm-studio", model=None, timeout=60.0):
         """
         Initialize LMStudioClient.
 
@@ -10,8 +79,10 @@ class LMStudioClient:
             base_url (str): Base URL of the LM Studio API.
             api_key (str): API key for authentication.
             model (str, optional): Model name to use for requests.
+            timeout (float): Per-request timeout in seconds. Retries are left to the caller.
         """
-        self.client = OpenAI(base_url=base_url, api_key=api_key)
+        self.client = OpenAI(base_url=base_url, api_key=api_key, timeout=timeout, max_retries=0)
+        self.base_url = base_url
         self.model = model
 
     def set_model(self, model_name):
@@ -23,7 +94,30 @@ class LMStudioClient:
         """
         self.model = model_name
 
-    def chat(self, messages, temperature=0.2, max_tokens=2048):
+    def list_models(self):
+        """
+        Lists the models currently available on the server (GET /v1/models).
+
+        Returns:
+            list: Model ids reported by the server.
+        """
+        return [m.id for m in self.client.models.list().data]
+
+    def embed(self, texts, model):
+        """
+        Embeds texts via the /v1/embeddings endpoint.
+
+        Args:
+            texts (list): Texts to embed.
+            model (str): Embedding model name.
+
+        Returns:
+            list: One embedding (list of floats) per text, in input order.
+        """
+        resp = self.client.embeddings.create(model=model, input=list(texts))
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+    def chat(self, messages, temperature=0.2, max_tokens=2048, timeout=None):
         """
         Sends a chat completion request to the LM Studio API.
 
@@ -31,10 +125,23 @@ class LMStudioClient:
             messages (list): List of message dicts for the conversation.
             temperature (float, optional): Sampling temperature.
             max_tokens (int, optional): Maximum number of tokens in the response.
+            timeout (float, optional): Timeout of this request (default: the client timeout).
 
         Returns:
             str: The content of the model's response message.
 
+        Raises:
+            ValueError: If no model is set.
+        """
+        return self.chat_with_usage(messages, temperature=temperature, max_tokens=max_tokens, timeout=timeout)[0]
+
+    def chat_with_usage(self, messages, temperature=0.2, max_tokens=2048, timeout=None):
+        """
+        Like chat(), but also returns the token usage reported by the server.
+
+        Returns:
+            tuple: (content, usage) with usage as dict of 'prompt_tokens' and 'completion_tokens'.
+
         Raises:
             ValueError: If no model is set.
         """
@@ -44,9 +151,241 @@ class LMStudioClient:
             model=self.model,
             messages=messages,
             temperature=temperature,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            **({"timeout": timeout} if timeout is not None else {})
         )
-        return resp.choices[0].message.content
+        usage = {"prompt_tokens": getattr(resp.usage, "prompt_tokens", 0) or 0,
+                 "completion_tokens": getattr(resp.usage, "completion_tokens", 0) or 0}
+        return resp.choices[0].message.content, usage
+
+
+class _Endpoint:
+    """
+    State of one inference server inside an LMStudioPool.
+    """
+
+    def __init__(self, base_url, api_key, model, timeout):
+        self.client = LMStudioClient(base_url=base_url, api_key=api_key, model=model, timeout=timeout)
+        self.base_url = base_url
+        self.inflight = 0        # outstanding requests
+        self.latency = None      # EWMA of request latency in seconds
+        self.healthy = True      # optimistic until the first probe says otherwise
+        self.models = None       # model ids from the last probe (None = not probed yet)
+
+    def serves(self, model):
+        # Unprobed endpoints are assumed to serve the model
+        return self.models is None or model in self.models
+
+
+class LMStudioPool:
+    def __init__(self, base_urls, api_key="lm-studio", model=None, strategy="least_loaded",
+                 health_interval=15.0, latency_alpha=0.3, timeout=60.0):
+        """
+        Pool of OpenAI-compatible endpoints (LM Studio, llama.cpp server, vLLM) behind the
+        LMStudioClient interface.
+
+        Each request is routed to a healthy endpoint that has the model loaded. Endpoints are
+        probed via /v1/models in a background thread; failing endpoints are ejected and
+        re-admitted as soon as a probe succeeds again.
+
+        Args:
+            base_urls (list): Base URLs of the servers, e.g. ["http://gpu1:1234/v1", ...].
+            api_key (str): API key for authentication.
+            model (str, optional): Model name to use for requests.
+            strategy (str): "least_loaded" (fewest outstanding requests, latency as tie-break)
+                or "latency" (lowest recent latency weighted by outstanding requests + 1).
+            health_interval (float): Seconds between health probes; 0 disables the probe thread.
+            latency_alpha (float): Smoothing factor of the latency EWMA.
+            timeout (float): Per-request timeout in seconds.
+        """
+        if not base_urls:
+            raise ValueError("Mindestens eine base_url angeben.")
+        if strategy not in ("least_loaded", "latency"):
+            raise ValueError(f"Unbekannte Strategie: {strategy}")
+        self.endpoints = [_Endpoint(u, api_key, model, timeout) for u in base_urls]
+        self.model = model
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self.latency_alpha = latency_alpha
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if health_interval:
+            self.start_health_checks()
+
+    def set_model(self, model_name):
+        """
+        Set the model name for requests.
+
+        Args:
+            model_name (str): Name of the model to use.
+        """
+        self.model = model_name
+        for ep in self.endpoints:
+            ep.client.set_model(model_name)
+
+    def check_health(self):
+        """
+        Probes every endpoint via /v1/models and updates its health and loaded models.
+
+        Returns:
+            dict: {base_url: bool} whether the endpoint is usable for the current model.
+        """
+        status = {}
+        for ep in self.endpoints:
+            try:
+                models = set(ep.client.list_models())
+                healthy = True
+            except Exception:
+                models, healthy = None, False
+            with self._lock:
+                ep.healthy = healthy
+                if models is not None:
+                    ep.models = models
+            status[ep.base_url] = healthy and (self.model is None or ep.serves(self.model))
+        return status
+
+    def list_models(self):
+        """
+        Probes all endpoints and returns the models available on at least one healthy endpoint.
+
+        Raises:
+            NoHealthyEndpointError: If no endpoint answers.
+        """
+        self.check_health()
+        with self._lock:
+            healthy = [ep for ep in self.endpoints if ep.healthy]
+            if not healthy:
+                raise NoHealthyEndpointError("Kein Endpunkt erreichbar.")
+            return sorted(set().union(*(ep.models or () for ep in healthy)))
+
+    def start_health_checks(self):
+        """
+        Starts the background thread probing all endpoints every `health_interval` seconds.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def _loop():
+            while not self._stop.is_set():
+                self.check_health()
+                self._stop.wait(self.health_interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=_loop, name="lm-pool-health", daemon=True)
+        self._thread.start()
+
+    def stop_health_checks(self):
+        """
+        Stops the background health probe.
+        """
+        self._stop.set()
+
+    def stats(self):
+        """
+        Returns a snapshot of the routing state per endpoint.
+
+        Returns:
+            list: Dicts with base_url, healthy, inflight, latency and models.
+        """
+        with self._lock:
+            return [{"base_url": ep.base_url, "healthy": ep.healthy, "inflight": ep.inflight,
+                     "latency": ep.latency, "models": sorted(ep.models) if ep.models else ep.models}
+                    for ep in self.endpoints]
+
+    def _acquire(self, model):
+        """
+        Picks an endpoint serving `model` for the next request and reserves a slot on it.
+        """
+        with self._lock:
+            candidates = [ep for ep in self.endpoints if ep.healthy and ep.serves(model)]
+            if not candidates:
+                raise NoHealthyEndpointError(f"Kein gesunder Endpunkt mit Modell {model} verfügbar.")
+            # Endpoints without a latency sample yet sort first so they get measured
+            if self.strategy == "least_loaded":
+                ep = min(candidates, key=lambda e: (e.inflight, e.latency or 0.0))
+            else:
+                # expected wait: latency grows with the requests already queued on the endpoint
+                ep = min(candidates, key=lambda e: ((e.latency or 0.0) * (e.inflight + 1), e.inflight))
+            ep.inflight += 1
+            return ep
+
+    def _release(self, ep, elapsed=None, failed=False):
+        with self._lock:
+            ep.inflight -= 1
+            if failed:
+                # eject until the next successful health probe
+                ep.healthy = False
+            elif elapsed is not None:
+                a = self.latency_alpha
+                ep.latency = elapsed if ep.latency is None else a * elapsed + (1 - a) * ep.latency
+
+    def chat(self, messages, temperature=0.2, max_tokens=2048, timeout=None):
+        """
+        Sends a chat completion request to the selected endpoint.
+
+        Args:
+            messages (list): List of message dicts for the conversation.
+            temperature (float, optional): Sampling temperature.
+            max_tokens (int, optional): Maximum number of tokens in the response.
+            timeout (float, optional): Timeout of this request (default: the client timeout).
+
+        Returns:
+            str: The content of the model's response message.
+
+        Raises:
+            ValueError: If no model is set.
+            NoHealthyEndpointError: If no healthy endpoint serves the model.
+        """
+        return self.chat_with_usage(messages, temperature=temperature, max_tokens=max_tokens, timeout=timeout)[0]
+
+    def chat_with_usage(self, messages, temperature=0.2, max_tokens=2048, timeout=None):
+        """
+        Like chat(), but also returns the token usage reported by the endpoint.
+
+        Returns:
+            tuple: (content, usage) with usage as dict of 'prompt_tokens' and 'completion_tokens'.
+        """
+        if self.model is None:
+            raise ValueError("Kein Modell gesetzt. Mit set_model() definieren.")
+        return self._call(self.model, lambda c: c.chat_with_usage(messages, temperature=temperature,
+                                                                    max_tokens=max_tokens, timeout=timeout))
+
+    def embed(self, texts, model):
+        """
+        Embeds texts on an endpoint serving the embedding model.
+
+        Args:
+            texts (list): Texts to embed.
+            model (str): Embedding model name.
+
+        Returns:
+            list: One embedding (list of floats) per text, in input order.
+        """
+        # embedding latency says nothing about chat latency -> not booked into the routing EWMA
+        return self._call(model, lambda c: c.embed(texts, model), book_latency=False)
+
+    def _call(self, model, fn, book_latency=True):
+        """
+        Runs fn(client) on the selected endpoint and books its latency or failure.
+        """
+        ep = self._acquire(model)
+        t0 = time.perf_counter()
+        try:
+            result = fn(ep.client)
+        except APITimeoutError:
+            # slow, not down (a busy node times out long generations) -> only book the latency
+            self._release(ep, elapsed=time.perf_counter() - t0 if book_latency else None)
+            raise
+        except (APIConnectionError, InternalServerError):
+            # server unreachable or broken -> eject
+            self._release(ep, failed=True)
+            raise
+        except Exception:
+            self._release(ep)
+            raise
+        self._release(ep, elapsed=time.perf_counter() - t0 if book_latency else None)
+        return result
 
 
 if __name__ == "__main__":
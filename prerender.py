@@ -0,0 +1,185 @@
+# prerender.py
+# Offline pre-render of highlight HTML and skill tables for the whole dataset.
+#   python prerender.py --workers 8
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import pickle
+import time
+from rendering import build_skill_table, insert_highlights, pack_html, unpack_html, _highlight_spans
+
+# bump whenever insert_highlights() or build_skill_table() change their output
+RENDERER_VERSION = "2"
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "data/artifacts")
+
+
+def row_hash(row) -> str:
+    """
+    Hash of everything the rendering of a dataset row depends on.
+    """
+    payload = repr((row["X"], row.get("Y"), row.get("y_pred"), row.get("y_pred_detailed")))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def persons_hash(persons) -> str:
+    """
+    Hash of the person skill lists (the "Person" column of the skill tables).
+    """
+    return hashlib.sha1(repr(persons).encode("utf-8")).hexdigest()[:12]
+
+
+def dataset_hash(row_hashes) -> str:
+    """
+    Hash of a dataset given the hashes of its rows.
+    """
+    return hashlib.sha1("".join(row_hashes).encode("utf-8")).hexdigest()[:12]
+
+
+def _render_row(args):
+    """
+    Renders highlight HTML and one skill table per person for one row (runs in a worker process).
+    """
+    rh, text, detailed, y_true, y_pred, persons, dedupe = args
+    return rh, {
+        "highlight": pack_html(insert_highlights(text, _highlight_spans(detailed), dedupe=dedupe)),
+        "tables": [pack_html(build_skill_table(detailed, y_true, y_pred, p)) for p in persons],
+    }
+
+
+class Artifacts:
+    def __init__(self, rows=None, meta=None):
+        """
+        Pre-rendered HTML of a dataset, looked up by row hash.
+
+        Rows whose hash is not in the artifact (new or changed rows), or artifacts rendered with
+        other persons or another highlight mode, return None and have to be rendered on demand.
+
+        Args:
+            rows (dict): {row_hash: {"highlight": bytes, "tables": [bytes per person]}}.
+            meta (dict): Manifest with 'renderer_version', 'persons_hash' and 'dedupe'.
+        """
+        self.rows = rows or {}
+        self.meta = meta or {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def highlight_packed(self, rh, dedupe):
+        """
+        Compressed highlight HTML of the row with hash `rh` or None.
+        """
+        entry = self.rows.get(rh)
+        if entry is None or self.meta.get("dedupe") != dedupe:
+            return None
+        return entry["highlight"]
+
+    def table(self, rh, person_idx, persons):
+        """
+        Skill table HTML of the row with hash `rh` for person `person_idx` or None.
+        """
+        entry = self.rows.get(rh)
+        if entry is None or self.meta.get("persons_hash") != persons_hash(persons):
+            return None
+        return unpack_html(entry["tables"][person_idx])
+
+
+def _artifact_dirs(root):
+    # artifact dirs of the current renderer version, newest first
+    dirs = glob.glob(os.path.join(root, "*", RENDERER_VERSION, "artifacts.pkl"))
+    return sorted(dirs, key=os.path.getmtime, reverse=True)
+
+
+def load_artifacts(df=None, root=ARTIFACT_DIR):
+    """
+    Loads the artifacts for `df`: the exact dataset version if built, otherwise the newest
+    artifacts of the current renderer version (unchanged rows are still found by their hash).
+
+    Args:
+        df (pd.DataFrame, optional): The dataset shown in the dashboard (None: newest artifacts).
+        root (str): Artifact directory.
+
+    Returns:
+        Artifacts: Possibly empty.
+    """
+    hashes = [row_hash(r) for _, r in df.iterrows()] if df is not None else []
+    exact = os.path.join(root, dataset_hash(hashes), RENDERER_VERSION, "artifacts.pkl")
+    candidates = [exact] if os.path.exists(exact) else _artifact_dirs(root)
+    for path in candidates:
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            continue
+        return Artifacts(data["rows"], data["meta"])
+    return Artifacts()
+
+
+def build_artifacts(df, persons, workers=None, dedupe=False, root=ARTIFACT_DIR):
+    """
+    Renders all rows of `df` in a process pool and writes them to
+    `<root>/<dataset_hash>/<RENDERER_VERSION>/artifacts.pkl`.
+
+    Rows already rendered by an earlier build of the same renderer version (same row hash,
+    persons and highlight mode) are reused.
+
+    Args:
+        df (pd.DataFrame): Dataset with X, Y, y_pred and y_pred_detailed.
+        persons (list): Skill lists of the persons.
+        workers (int, optional): Worker processes (default: CPU count).
+        dedupe (bool): Highlight mode, see insert_highlights().
+        root (str): Artifact directory.
+
+    Returns:
+        dict: Manifest with paths, row counts and timing.
+    """
+    t0 = time.perf_counter()
+    hashes = [row_hash(r) for _, r in df.iterrows()]
+    prev = load_artifacts(df, root)
+    p_hash = persons_hash(persons)
+    reusable = prev.rows if prev.meta.get("persons_hash") == p_hash and prev.meta.get("dedupe") == dedupe else {}
+
+    rows, todo = {}, []
+    for rh, (_, r) in zip(hashes, df.iterrows()):
+        if rh in rows:
+            continue
+        if rh in reusable:
+            rows[rh] = reusable[rh]
+        else:
+            todo.append((rh, r["X"], r.get("y_pred_detailed") or [], r.get("Y"), r.get("y_pred"), persons, dedupe))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+        for rh, entry in ex.map(_render_row, todo, chunksize=max(1, len(todo) // (4 * (workers or os.cpu_count() or 1)))):
+            rows[rh] = entry
+
+    meta = {"renderer_version": RENDERER_VERSION, "dataset_hash": dataset_hash(hashes),
+            "persons_hash": p_hash, "dedupe": dedupe, "rows": len(rows), "rendered": len(todo),
+            "reused": len(rows) - len(todo), "seconds": round(time.perf_counter() - t0, 2)}
+    out_dir = os.path.join(root, meta["dataset_hash"], RENDERER_VERSION)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = os.path.join(out_dir, "artifacts.pkl.tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump({"rows": rows, "meta": meta}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, os.path.join(out_dir, "artifacts.pkl"))
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    meta["path"] = out_dir
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render highlight HTML and skill tables for the dataset.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--dedupe", action="store_true", help="render deduplicated tooltips (HIGHLIGHT_DEDUPE=1)")
+    args = parser.parse_args()
+
+    from data import load_data_df, persons
+
+    # all prediction files the dashboard shows
+    print(json.dumps(build_artifacts(load_data_df(), persons, workers=args.workers, dedupe=args.dedupe), indent=2))
+
+
+if __name__ == "__main__":
+    main()
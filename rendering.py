@@ -0,0 +1,506 @@
+# rendering.py
+# HTML and figure rendering of matches (highlights, skill tables, score gauge). No LLM client or
+# other network side effects, so prerender workers and tests can import it cheaply.
+import html
+import textwrap
+import zlib
+from typing import Optional
+import plotly.graph_objects as go
+from plotly.colors import sample_colorscale
+
+
+def visualize_score(
+        score: float,
+        title: Optional[str] = None,
+        explanation: Optional[str] = None,
+        steps: int = 50,
+        wrap: int = 80,
+) -> go.Figure:
+    """
+    0–100% tachometer (red→green) as Plotly gauge.
+    - score: 0–100, values are clamped.
+    - title: Title above the plot.
+    - explanation: Text below the plot (automatic line wrapping).
+    - steps: Number of background bands.
+    - wrap: Maximum characters per line for line wrapping.
+    Note: No fig.show() -> no double rendering in Jupyter.
+    """
+    s = max(0.0, min(100.0, float(score)))
+    cur_col = sample_colorscale("RdYlGn", s / 100.0)[0]
+
+    # Farbverlauf
+    step_ranges = []
+    for i in range(steps):
+        a = 100.0 * i / steps
+        b = 100.0 * (i + 1) / steps
+        c = sample_colorscale("RdYlGn", (i + 0.5) / steps)[0]
+        step_ranges.append({"range": [a, b], "color": c})
+
+    fig = go.Figure(
+        go.Indicator(
+            mode="gauge+number",
+            value=s,
+            number={"suffix": "%", "valueformat": ".1f"},
+            title={"text": title or ""},
+            gauge={
+                "axis": {"range": [0, 100], "tickvals": [0, 25, 50, 75, 100], "ticks": "outside"},
+                "bar": {"color": cur_col, "thickness": 0.25},
+                "borderwidth": 1,
+                "steps": step_ranges,
+                "threshold": {"line": {"color": cur_col, "width": 4}, "thickness": 0.85, "value": s},
+            },
+            domain={"x": [0, 1], "y": [0, 1]},
+        )
+    )
+
+    # Explanation grows downwards, line breaks via <br>
+    lines = 0
+    if explanation:
+        wrapped = textwrap.fill(str(explanation), width=wrap)
+        text = wrapped.replace("\n", "<br>")
+        # start underneath the gauge
+        fig.add_annotation(
+            x=0.5, xref="paper", xanchor="center",
+            y=0, yref="paper", yanchor="top", yshift=-8,
+            text=text, showarrow=False, align="center"
+        )
+        lines = text.count("<br>") + 1
+
+    # Layout: additional space below for explanation
+    base_bottom = 36  # base margin bottom
+    line_height = 18  # margin bottom per line
+    extra = max(0, lines) * line_height
+    fig.update_layout(
+        margin=dict(l=20, r=20, t=50 if title else 20, b=base_bottom + extra),
+        height=340 + int(extra * 0.6),
+    )
+
+    return fig
+
+
+def _find_all_occurrences(text: str, needle: str):
+    """
+    Finds all occurrences of the substring `needle` in the string `text`.
+
+    Returns a list of tuples, where each tuple contains the start and end indices
+    of an occurrence of `needle` in `text`. If `needle` is empty, returns an empty list.
+
+    Args:
+        text (str): The string to search in.
+        needle (str): The substring to search for.
+
+    Returns:
+        List[Tuple[int, int]]: List of (start, end) index pairs for each occurrence.
+    """
+    idxs, i, L = [], 0, len(needle)
+    if not needle:
+        return idxs
+    while True:
+        j = text.find(needle, i)
+        if j == -1:
+            break
+        idxs.append((j, j + L))
+        i = j + L
+    return idxs
+
+
+def _coverage_labels(text: str, spans_with_skills):
+    """
+    Returns a list of sets, one for each character in `text`, indicating which skills and reasons
+    cover each character position. Each set contains tuples of (skill, reason, span).
+
+    Args:
+        text (str): The text to analyze.
+        spans_with_skills (list): List of dicts with keys "span", "skill", "reason".
+
+    Returns:
+        List[Set[Tuple[str, str, str]]]: Coverage labels for each character position.
+    """
+    # Initialize coverage: one set per character in text
+    cov = [set() for _ in range(len(text))]
+    for entry in spans_with_skills:
+        span = entry.get("span")
+        skill = entry.get("skill")
+        reason = entry.get("reason")
+        # Skip if span or skill is missing
+        if not span or not skill:
+            continue
+        # Clean up span string
+        span = span.replace('"', '').strip()
+        # Skip if span is empty or too short
+        if not span or len(span) < 2:
+            continue
+        # Find all occurrences of the span in text
+        for s, e in _find_all_occurrences(text, span):
+            # Clamp indices to valid range
+            s = max(0, min(s, len(text)))
+            e = max(0, min(e, len(text)))
+            # Mark coverage for each character in the span
+            for i in range(s, e):
+                cov[i].add((skill, reason, span))
+    return cov
+
+
+def _segments_from_coverage(text: str, cov):
+    """
+    Splits the text into segments based on coverage labels.
+
+    Each segment is a tuple (start, end, labels), where 'labels' is the set of coverage labels
+    for that segment. Segments are created whenever the coverage labels change.
+
+    Args:
+        text (str): The input text.
+        cov (list): List of sets, one per character, indicating coverage labels.
+
+    Returns:
+        list: List of (start, end, labels) tuples for each segment.
+    """
+    if not text:
+        return []
+    if not cov:
+        return [(0, len(text), set())]
+    segments = []
+    prev_labels = cov[0]
+    start = 0
+    # Iterate through text, split at coverage label changes
+    for i in range(1, len(text)):
+        if cov[i] != prev_labels:
+            segments.append((start, i, prev_labels))
+            start = i
+            prev_labels = cov[i]
+    segments.append((start, len(text), prev_labels))
+    return segments
+
+
+def insert_highlights_old(text: str, spans_with_skills):
+    """
+    Inserts HTML highlights into the text for spans covered by skills and reasons.
+
+    Each segment of the text that is covered by one or more skills/reasons is wrapped in a
+    <span> and <mark> tag with a background color. A tooltip card is added for each segment,
+    showing the skill, reason, and span information.
+
+    Args:
+        text (str): The input text to highlight.
+        spans_with_skills (list): List of dicts with keys "span", "skill", "reason".
+
+    Returns:
+        str: HTML string with highlights and tooltips.
+    """
+    cov = _coverage_labels(text, spans_with_skills)
+    segs = _segments_from_coverage(text, cov)
+
+    # Color palette for highlights
+    palette = [
+        "#fde68a", "#fca5a5", "#93c5fd", "#a7f3d0", "#c4b5fd",
+        "#f9a8d4", "#fdba74", "#86efac", "#fcd34d", "#fca5a5"
+    ]
+    combo2color = {}
+
+    parts = []
+    for s, e, labels in segs:
+        seg_txt_raw = text[s:e]
+        seg_txt = html.escape(seg_txt_raw)
+
+        # If no labels or segment is empty, just append the text
+        if not labels or seg_txt_raw.strip() == "":
+            parts.append(seg_txt)
+            continue
+
+        # Create a key for the combination of skills/reasons/spans
+        key = tuple(sorted((str(sk) or "", str(rs) or "", str(spa) or "") for (sk, rs, spa) in labels))
+        if key not in combo2color:
+            combo2color[key] = palette[len(combo2color) % len(palette)]
+        color = combo2color[key]
+
+        # Build tooltip card HTML
+        tip_rows = []
+        for sk, rs, spa in key:
+            tip_rows.append(
+                f'<div class="row">'
+                f'<div class="skill"><b>{html.escape(sk)}</b></div>'
+                f'<div class="reason"><strong>Reason</strong>:<br> {html.escape(rs)}</div>'
+                f'<div class="span"><strong>Span</strong>:<br> "{html.escape(spa)}"</div>'
+                f'<br>'
+                f'</div>'
+            )
+        tip_html = "".join(tip_rows)
+
+        # Wrap the segment in highlight and tooltip HTML
+        parts.append(
+            f'<span class="es-tooltip">'
+            f'<mark style="background:{color}">{seg_txt}</mark>'
+            f'<span class="es-card">{tip_html}</span>'
+            f'</span>'
+        )
+    return "".join(parts)
+
+
+def _tooltip_item_html(sk, rs, spa, attrs=""):
+    """
+    Tooltip entry for one (skill, reason, span) label.
+
+    Args:
+        sk (str): Skill.
+        rs (str): Reason.
+        spa (str): Span.
+        attrs (str): Extra attributes of the .es-item element.
+
+    Returns:
+        str: HTML of the .es-item.
+    """
+    return f"""
+    <div class="es-item"{attrs}>
+      <div class="es-skill">{html.escape(sk)}</div>
+      <div class="es-span">{html.escape(spa)}</div>
+      <details class="es-acc">
+        <summary>Reason</summary>
+        <div class="es-reason">{html.escape(rs)}</div>
+      </details>
+    </div>
+    """.strip()
+
+
+def _highlight_spans(detailed):
+    """
+    y_pred_detailed objects that are highlighted in the text: with span and any positive flag.
+    """
+    return [d for d in (detailed or []) if isinstance(d, dict) and d.get("span")
+            and (d.get("needed") or d.get("optional") or d.get("trainable"))]
+
+
+def insert_highlights(text: str, spans_with_skills, dedupe=False):
+    """
+    Inserts HTML highlights into the text for spans covered by skills and reasons.
+
+    Each segment of the text that is covered by one or more skills/reasons is wrapped in a
+    <span> and <mark> tag with a background color. A tooltip card is added for each segment,
+    showing the skill, reason, and span information.
+
+    With `dedupe`, each distinct (skill, reason, span) entry is emitted only once, in a shared
+    card below the text. Segments reference their label combination by id (`data-es`) and one
+    generated CSS rule per combination shows its entries while a segment is hovered. Clicking a
+    segment (or selecting it with the arrow keys) pins its entries through a hidden radio input,
+    so they stay visible while the pointer or focus is in the card and the Reason accordions
+    can be opened. The card stays below the text instead of next to the segment.
+
+    Args:
+        text (str): The input text to highlight.
+        spans_with_skills (list): List of dicts with keys "span", "skill", "reason".
+        dedupe (bool): Emit each tooltip entry once and reference it from the segments.
+
+    Returns:
+        str: HTML string with highlights and tooltips.
+    """
+    cov = _coverage_labels(text, spans_with_skills)
+    segs = _segments_from_coverage(text, cov)
+
+    # Color palette for highlights
+    palette = ["#fde68a", "#fca5a5", "#93c5fd", "#a7f3d0", "#c4b5fd",
+               "#f9a8d4", "#fdba74", "#86efac", "#fcd34d", "#fca5a5"]
+    combo2color = {}
+    combo2id, item2id = {}, {}  # dedupe: ids of label combinations and single entries
+    group = f"es-{zlib.crc32(text.encode('utf-8')):08x}"  # dedupe: radio group of the pins
+
+    parts = []
+    for s, e, labels in segs:
+        seg_txt_raw = text[s:e]
+        seg_txt = html.escape(seg_txt_raw)
+
+        # If no labels or segment is empty, just append the text
+        if not labels or seg_txt_raw.strip() == "":
+            parts.append(seg_txt)
+            continue
+
+        # Consistent color per combination of skills/reasons/spans
+        key = tuple(sorted((str(sk) or "", str(rs) or "", str(spa) or "") for (sk, rs, spa) in labels))
+        if key not in combo2color:
+            combo2color[key] = palette[len(combo2color) % len(palette)]
+        color = combo2color[key]
+
+        if dedupe:
+            combo_id = combo2id.setdefault(key, len(combo2id))
+            for item in key:
+                item2id.setdefault(item, len(item2id))
+            parts.append(f'<label class="es-ref" data-es="{combo_id}" style="background:{color}">'
+                         f'<input type="radio" class="es-pin" name="{group}">{seg_txt}</label>')
+            continue
+
+        # Tooltip content: one .es-item per skill in the same span
+        items_html = [_tooltip_item_html(sk, rs, spa) for sk, rs, spa in key]
+
+        tip_html = (
+                '<div class="es-tip">' +
+                "".join(items_html) +
+                '</div>'
+        )
+
+        # Wrap the segment in highlight and tooltip HTML
+        parts.append(
+            f'<div class="es-tooltip">'
+            f'  <mark style="background:{color}">{seg_txt}</mark>'
+            f'  <div class="es-card">{tip_html}</div>'
+            f'</div>'
+        )
+
+    if not dedupe or not combo2id:
+        return "".join(parts)
+
+    # per label combination: show its entries while hovered, or while pinned and no segment is hovered
+    rules = "".join(
+        f'.es-hl:has([data-es="{cid}"]:hover) {sel}{{display:grid}}'
+        f'.es-hl:not(:has(.es-ref:hover)):has([data-es="{cid}"] .es-pin:checked) {sel}{{display:grid}}'
+        for key, cid in combo2id.items()
+        for sel in [f':is({",".join(f"[data-es-item={item2id[item]}]" for item in key)})']
+    )
+    items_html = "".join(_tooltip_item_html(sk, rs, spa, f' data-es-item="{iid}"')
+                         for (sk, rs, spa), iid in item2id.items())
+    return (f'<div class="es-hl">{"".join(parts)}<style>{rules}</style>'
+            f'<div class="es-card es-pool"><div class="es-tip">{items_html}</div></div></div>')
+
+
+def pack_html(html_str: str) -> bytes:
+    """
+    Compresses rendered HTML (e.g. highlight payloads) for the server-side cache or storage.
+
+    Only the cached copy shrinks; unpack_html() restores the full HTML before it is sent.
+    """
+    return zlib.compress(html_str.encode("utf-8"), 9)
+
+
+def unpack_html(payload: bytes) -> str:
+    """
+    Inverse of pack_html.
+    """
+    return zlib.decompress(payload).decode("utf-8")
+
+
+def highlight_payload_sizes(rows):
+    """
+    Measures the highlight HTML sent per rerun in the inline and the deduplicated mode.
+
+    'dedupe_packed' is what the server-side cache holds (see pack_html()); the browser still
+    receives the uncompressed HTML.
+
+    Args:
+        rows (iterable): (text, spans_with_skills) pairs.
+
+    Returns:
+        dict: Total bytes per mode ('inline', 'dedupe') and of the compressed cache entries.
+    """
+    sizes = {"rows": 0, "inline": 0, "dedupe": 0, "dedupe_packed": 0}
+    for text, spans in rows:
+        dedup = insert_highlights(text, spans, dedupe=True)
+        sizes["rows"] += 1
+        sizes["inline"] += len(insert_highlights(text, spans).encode("utf-8"))
+        sizes["dedupe"] += len(dedup.encode("utf-8"))
+        sizes["dedupe_packed"] += len(pack_html(dedup))
+    return sizes
+
+
+def _esc(s: str) -> str:
+    return (str(s).replace("&","&amp;").replace("<","&lt;").replace(">","&gt;"))
+
+
+def build_skill_table(detailed, y_true, y_pred, person_skills):
+    """
+    Renders the skill table of an activity as HTML.
+
+    One row per skill from ground truth, prediction and detailed assessment with flags for
+    GT/Needed/Optional/Trainable/Person, a hover card with the unique reasons, and a background
+    color per group (GT and needed first, predicted-only last).
+
+    Args:
+        detailed (list): y_pred_detailed objects of the activity.
+        y_true (iterable): Ground-truth skills (Y).
+        y_pred (iterable): Predicted skills (y_pred).
+        person_skills (iterable): Skills of the selected person.
+
+    Returns:
+        str: HTML table.
+    """
+    y_true = set(y_true or [])
+    y_pred = set(y_pred or [])
+    idx = {}
+    for d in detailed:
+        sk = d.get("skill")
+        if sk:
+            idx.setdefault(sk, []).append(d)
+
+    # helper functions
+    def _flag_any(skill, key):
+        return any(bool(o.get(key)) for o in idx.get(skill, []))
+
+    def _uniq_reasons(skill):
+        seen, out = set(), []
+        for o in idx.get(skill, []):
+            r = (o.get("reason") or o.get("why") or "").strip()
+            if r and r not in seen:
+                seen.add(r); out.append(r)
+        return out
+
+    all_skills = sorted(set(y_true) | set(y_pred) | set(idx.keys()))
+    p_set = set(person_skills)
+
+    rows = []
+    for sk in all_skills:
+        needed  = _flag_any(sk, "needed")
+        optional= _flag_any(sk, "optional")
+        train   = _flag_any(sk, "trainable")
+        gt      = sk in y_true
+
+        if gt and needed:         group = 0
+        elif gt and optional:     group = 1
+        elif (not gt) and needed: group = 3
+        elif gt and (not needed): group = 2
+        elif gt or needed or optional or train: group = 4
+        else:                     group = 5
+
+        reasons = _uniq_reasons(sk)
+        if reasons:
+            reason_html = "".join(f'<div class="es-reason">{_esc(r)}</div>' for r in reasons)
+            skill_cell = (
+                f'<span class="es-tooltip" tabindex="0">'
+                f'  <mark>{_esc(sk)}</mark>'
+                f'  <div class="es-card"><div class="es-tip">'
+                f'    <details class="es-acc" open><summary>Reasons</summary>{reason_html}</details>'
+                f'  </div></div>'
+                f'</span>'
+            )
+        else:
+            skill_cell = _esc(sk)
+
+        rows.append({
+            "_group": group,
+            "Skill": skill_cell,
+            "GT": "x" if gt else "",
+            "Needed": "x" if needed else "",
+            "Optional": "x" if optional else "",
+            "Trainable": "x" if train else "",
+            "Person": "x" if sk in p_set else "",
+        })
+
+    # stable sort by group, then skill cell
+    rows.sort(key=lambda r: (r["_group"], r["Skill"]))
+    cols = ["Skill", "GT", "Needed", "Optional", "Trainable", "Person"]
+
+    cmap = {0:"#dcfce7", 1:"#FFE7BA", 2:"#fee2e2", 3:"#ff6961", 4:"#e0e7ff", 5:"#ffffff"}
+
+    # manual render of dataframe as HTML table
+    html_parts = [
+        '<table class="dataframe" style="width:100%; border-collapse:separate; border-spacing:0; font-size:14px;">',
+        '<thead><tr>',
+    ]
+    for c in cols:
+        html_parts.append(f'<th style="text-align:left; padding:8px; border-bottom:1px solid #e2e8f0;">{_esc(c)}</th>')
+    html_parts.append('</tr></thead><tbody>')
+
+    for r in rows:
+        bg = cmap.get(int(r["_group"]), "#ffffff")
+        html_parts.append(f'<tr style="background:{bg};">')
+        for c in cols:
+            html_parts.append(f'<td style="padding:6px 8px; border-bottom:1px solid #f1f5f9;">{r[c]}</td>')
+        html_parts.append('</tr>')
+
+    html_parts.append('</tbody></table>')
+    return "".join(html_parts)
@@ -0,0 +1,265 @@
+# similarity.py
+# Similar-activity search over a quantized, memory-mapped embedding index of the activity texts.
+#   python similarity.py --n-lists 64 --bench 100
+import argparse
+import os
+import threading
+import time
+import numpy as np
+from embeddings import EMBEDDING_MODEL, EmbeddingStore, embed_missing, store_path
+from dataset_manager import activity_id
+
+
+def _kmeans(vectors, n_lists, iters=10, seed=0):
+    """
+    Spherical k-means on normalized vectors.
+
+    Returns:
+        np.ndarray: Normalized centroids, shape (n_lists, dim).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = vectors[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+class ActivityIndex:
+    def __init__(self, path=None, dtype="float16", client=None, block_rows=16384, model=EMBEDDING_MODEL):
+        """
+        Cosine top-k index over activity texts.
+
+        Vectors are stored quantized (float16 or int8) in a memory-mapped EmbeddingStore, so the
+        index is opened without loading it and new rows are appended without rewriting it.
+        Queries scan the whole matrix block by block (brute force) or, after train_ivf(), only the
+        inverted lists closest to the query (IVF).
+
+        Args:
+            path (str, optional): Path prefix of the index files (default: per model, see store_path()).
+            dtype (str): Storage dtype ("float16" or "int8").
+            client (LMStudioClient or LMStudioPool, optional): Used to embed new texts.
+            block_rows (int): Rows per block of the brute-force scan.
+            model (str): Embedding model name.
+        """
+        path = path or store_path("activity_index", model)
+        self.store = EmbeddingStore(path, dtype=dtype, model=model)
+        self.model = model
+        self.client = client
+        self.block_rows = block_rows
+        self.centroids = None
+        self.assign = np.zeros(0, dtype=np.int32)  # inverted list of each row
+        self._lists = None  # (rows sorted by list, start offset per list), built lazily
+        self._lock = threading.Lock()
+        # background sync (start_sync)
+        self.sync_error = None      # error name of the last failed sync
+        self._sync_thread = None
+        self._synced_version = None
+        self._retry_at = 0.0        # monotonic time before which no new sync starts after a failure
+        self._backoff = 0.0
+        self._sync_lock = threading.Lock()
+        if os.path.exists(path + ".ivf.npz"):
+            ivf = np.load(path + ".ivf.npz")
+            self.centroids, self.assign = ivf["centroids"], ivf["assign"]
+            self._assign_new()
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def syncing(self):
+        return self._sync_thread is not None and self._sync_thread.is_alive()
+
+    def sync(self, texts, batch_size=64, save_every=1024):
+        """
+        Embeds the texts not yet in the index (e.g. newly appended rows) and appends them.
+
+        Vectors are saved in steps (see embed_missing()), so after a failure the next call only
+        embeds what is still missing.
+
+        Args:
+            texts (list): Activity texts.
+            batch_size (int): Texts per embedding request.
+            save_every (int): Texts per append to the store.
+
+        Returns:
+            int: Number of newly embedded texts.
+        """
+        with self._lock:
+            try:
+                return embed_missing(self.store, [activity_id(t) for t in texts], texts, self.client,
+                                     self.model, batch_size=batch_size, save_every=save_every)
+            finally:
+                self._assign_new()
+
+    def start_sync(self, texts, version=None, ivf_min_rows=10000, backoff=(10.0, 300.0)):
+        """
+        Runs sync() in a background thread, then trains the IVF index once it has `ivf_min_rows`
+        rows, so rendering a page never waits for the embedding endpoint. Queries during the sync
+        see the rows indexed so far.
+
+        Does nothing while a sync runs, if `version` was synced already, or within the backoff after
+        a failed sync (doubling from backoff[0] up to backoff[1] seconds).
+
+        Args:
+            texts (iterable): Activity texts; converted in the background thread.
+            version (int, optional): Dataset version of `texts`.
+            ivf_min_rows (int): Row count from which an IVF index is trained (0 = never).
+            backoff (tuple): (first, maximum) seconds between retries after a failure.
+
+        Returns:
+            bool: True if a sync was started.
+        """
+        with self._sync_lock:
+            if self.syncing or time.monotonic() < self._retry_at:
+                return False
+            if version is not None and version == self._synced_version:
+                return False
+
+            def _run():
+                try:
+                    self.sync([str(t) for t in texts])
+                    if ivf_min_rows and self.centroids is None and len(self) >= ivf_min_rows:
+                        self.train_ivf()
+                except Exception as e:
+                    print(f"Activity index sync failed: {type(e).__name__}: {e}")
+                    with self._sync_lock:
+                        self.sync_error = type(e).__name__
+                        self._backoff = min(backoff[1], self._backoff * 2 or backoff[0])
+                        self._retry_at = time.monotonic() + self._backoff
+                    return
+                with self._sync_lock:
+                    self.sync_error, self._backoff, self._synced_version = None, 0.0, version
+
+            self._sync_thread = threading.Thread(target=_run, name="activity-index-sync", daemon=True)
+            self._sync_thread.start()
+            return True
+
+    def train_ivf(self, n_lists=None, iters=10, sample=50000):
+        """
+        Clusters the indexed vectors into inverted lists for sub-linear queries.
+
+        Args:
+            n_lists (int, optional): Number of lists (default: sqrt of the row count).
+            iters (int): k-means iterations.
+            sample (int): Maximum rows used for training.
+        """
+        with self._lock:
+            n = len(self.store)
+            n_lists = min(n_lists or max(1, int(np.sqrt(n))), n)
+            rows = np.sort(np.random.default_rng(0).choice(n, min(n, sample), replace=False))
+            self.centroids = _kmeans(self.store.take(rows), n_lists, iters)
+            self.assign = np.zeros(0, dtype=np.int32)
+            self._assign_new()
+
+    def _assign_new(self):
+        # assign rows appended since the last call to their nearest centroid and persist
+        if self.centroids is None or len(self.assign) >= len(self.store):
+            return
+        parts = [self.assign]
+        for start in range(len(self.assign), len(self.store), self.block_rows):
+            block = self.store.take(slice(start, min(start + self.block_rows, len(self.store))))
+            parts.append(np.argmax(block @ self.centroids.T, axis=1).astype(np.int32))
+        self.assign = np.concatenate(parts)
+        self._lists = None
+        np.savez(self.store.path + ".ivf.npz", centroids=self.centroids, assign=self.assign)
+
+    def vector(self, text):
+        """
+        Indexed vector of `text` or None if it is not in the index.
+        """
+        row = self.store.row(activity_id(text))
+        return None if row is None else self.store.take([row])[0]
+
+    def search(self, query, k=5, n_probe=8, exclude=()):
+        """
+        Top-k most similar indexed activities for query vectors.
+
+        Args:
+            query (np.ndarray): Normalized query vector(s), shape (dim,) or (q, dim).
+            k (int): Results per query.
+            n_probe (int): Inverted lists scanned per query (IVF only).
+            exclude (iterable): Keys never returned (e.g. the query activity itself).
+
+        Returns:
+            list: Per query a list of (key, cosine similarity), best first.
+        """
+        q = np.atleast_2d(np.asarray(query, dtype=np.float32))
+        n = len(self.store)
+        if n == 0:
+            return [[] for _ in q]
+        excl = [r for r in (self.store.row(key) for key in exclude) if r is not None]
+        kk = min(n, k + len(excl))
+        if self.centroids is not None and len(self.assign) == n:
+            rows_per_query = self._probe(q, n_probe)
+            all_sims = None
+        else:
+            rows_per_query = [None] * len(q)
+            all_sims = self._scan(q)
+        out = []
+        for j, (qi, rows) in enumerate(zip(q, rows_per_query)):
+            if rows is None:
+                sims = all_sims[:, j]
+                cand = np.arange(n)
+            else:
+                sims = self.store.take(rows) @ qi
+                cand = rows
+            if excl:
+                sims[np.isin(cand, excl)] = -np.inf
+            top = min(kk, len(sims))
+            if top == 0:
+                out.append([])
+                continue
+            idx = np.argpartition(-sims, top - 1)[:top]
+            idx = idx[np.argsort(-sims[idx])]
+            out.append([(self.store.keys[cand[i]], float(sims[i])) for i in idx
+                        if np.isfinite(sims[i])][:k])
+        return out
+
+    def _probe(self, q, n_probe):
+        if self._lists is None:
+            order = np.argsort(self.assign, kind="stable")
+            offsets = np.searchsorted(self.assign[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, offsets)
+        order, offsets = self._lists
+        probes = np.argsort(-(q @ self.centroids.T), axis=1)[:, :n_probe]
+        # sorted rows -> sequential reads from the memory map
+        return [np.sort(np.concatenate([order[offsets[c]:offsets[c + 1]] for c in p])) for p in probes]
+
+    def _scan(self, q):
+        # brute force for all queries at once, block by block over the memory map
+        n = len(self.store)
+        sims = np.empty((n, len(q)), dtype=np.float32)
+        for start in range(0, n, self.block_rows):
+            end = min(start + self.block_rows, n)
+            sims[start:end] = self.store.take(slice(start, end)) @ q.T
+        return sims
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the similar-activity index for the dataset.")
+    parser.add_argument("--dtype", default="float16", choices=["float16", "int8"])
+    parser.add_argument("--n-lists", type=int, default=0, help="train an IVF index with n lists (0 = brute force)")
+    parser.add_argument("--bench", type=int, default=0, help="time n random queries")
+    args = parser.parse_args()
+
+    from data import load_data_df
+
+    index = ActivityIndex(dtype=args.dtype)
+    print(f"embedded {index.sync(load_data_df()['X'].astype(str).tolist())} new texts, {len(index)} indexed")
+    if args.n_lists:
+        index.train_ivf(args.n_lists)
+    if args.bench:
+        rows = np.random.default_rng(0).choice(len(index), args.bench)
+        t0 = time.perf_counter()
+        for r in rows:
+            index.search(index.store.take([r])[0], k=5)
+        print(f"{(time.perf_counter() - t0) / args.bench * 1000:.2f} ms per query")
+
+
+if __name__ == "__main__":
+    main()
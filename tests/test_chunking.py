@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+import functions
+from functions import _chunk_text, _estimate_tokens
+
+
+def _sentences(n, words=12):
+    return [" ".join(f"w{i}x{j}" for j in range(words)) + "." for i in range(n)]
+
+
+def test_chunks_respect_budget_and_keep_all_text():
+    text = " ".join(_sentences(40))
+    chunks = _chunk_text(text, [], 64)
+    assert len(chunks) > 1
+    assert all(_estimate_tokens(c) <= 64 for c, _ in chunks)
+    assert " ".join(c for c, _ in chunks) == text
+    assert all(c.endswith(".") for c, _ in chunks)  # cut on sentence boundaries
+
+
+def test_span_across_sentences_stays_in_one_chunk():
+    sents = _sentences(30)
+    span = sents[10].split()[-1] + " " + sents[11].split()[0]  # crosses the sentence break
+    detailed = [{"skill": "work in teams", "span": span, "needed": True}]
+    chunks = _chunk_text(" ".join(sents), detailed, 64)
+    hits = [(c, ev) for c, ev in chunks if span in c]
+    assert len(hits) == 1
+    assert hits[0][1] == [("work in teams", span)]
+    assert all(ev == [] for c, ev in chunks if span not in c)
+
+
+def test_long_sentence_without_span_is_cut_at_whitespace():
+    text = " ".join(f"word{i}" for i in range(400))
+    chunks = _chunk_text(text, [], 50)
+    assert len(chunks) > 1
+    assert all(_estimate_tokens(c) <= 51 for c, _ in chunks)
+    assert " ".join(c for c, _ in chunks).split() == text.split()
+
+
+def test_failed_part_fails_the_match(monkeypatch):
+    calls = []
+
+    def score_call(prompt, detailed=True, deadline=None):
+        calls.append(prompt)
+        if "part 2 of" in prompt:
+            return functions._failed_result("Model call failed (APITimeoutError)")
+        return {"score": 0.8, "expl": None, "expl_short": "ok", "failed": False}
+
+    monkeypatch.setattr(functions, "_score_call", score_call)
+    monkeypatch.setattr(functions, "LLM_CHUNK_TOKENS", 64)
+    text = " ".join(_sentences(20))
+    res = functions._worker(text, [], ["show empathy"], "goal", "interests", detailed=False)
+    assert res["failed"] and "Part 2" in res["expl"]
+    assert "parts" not in res
+    assert not any("assessed in" in p for p in calls)  # no reduce call on partial results
+
+
+def test_parts_and_reduce_share_one_deadline(monkeypatch):
+    deadlines = []
+
+    def chat(messages, deadline=None, **kwargs):
+        deadlines.append(deadline)
+        return '{"score": 0.5, "explanation_short": "ok"}'
+
+    monkeypatch.setattr(functions, "_chat_with_retry", chat)
+    monkeypatch.setattr(functions, "LLM_CHUNK_TOKENS", 64)
+    t0 = time.monotonic()
+    res = functions._worker(" ".join(_sentences(20)), [], ["show empathy"], "goal", "interests", detailed=False)
+    assert not res["failed"] and len(res["parts"]) > 1
+    assert len(deadlines) == len(res["parts"]) + 1 and len(set(deadlines)) == 1
+    assert deadlines[0] <= t0 + functions.LLM_DEADLINE + 1.0
+
+
+def test_passed_deadline_fails_without_a_request(monkeypatch):
+    monkeypatch.setattr(functions, "_chat_once", lambda *a, **kw: pytest.fail("no request expected"))
+    with pytest.raises(TimeoutError):
+        functions._chat_with_retry([{"role": "user", "content": "x"}], deadline=time.monotonic() - 1)
@@ -0,0 +1,70 @@
+import ast
+
+from dataset_manager import DatasetManager
+
+CONVERTERS = {"y_pred_detailed": ast.literal_eval}
+HEADER = "X,y_pred_detailed\n"
+
+
+def _row(i):
+    return f'"activity {i}","[{{\'skill\': \'s{i}\'}}]"\n'
+
+
+def test_append_parses_only_new_rows(tmp_path):
+    path = tmp_path / "pred.csv"
+    path.write_text(HEADER + _row(0) + _row(1), encoding="utf-8")
+    manager = DatasetManager(str(tmp_path), converters=CONVERTERS)
+    first = manager.snapshot()
+    assert first.version == 1 and list(first.df["X"]) == ["activity 0", "activity 1"]
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(_row(2))
+    assert manager.refresh()
+    snap = manager.snapshot()
+    assert snap.version == 2
+    assert list(snap.df["X"]) == ["activity 0", "activity 1", "activity 2"]
+    assert snap.df["y_pred_detailed"].iloc[2] == [{"skill": "s2"}]
+    assert len(first) == 2  # published snapshots are never modified
+
+
+def test_incomplete_row_waits_for_the_writer(tmp_path):
+    path = tmp_path / "pred.csv"
+    path.write_text(HEADER + _row(0), encoding="utf-8")
+    manager = DatasetManager(str(tmp_path), converters=CONVERTERS)
+
+    half = _row(1)[:10]
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(half)
+    assert not manager.refresh()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(_row(1)[10:])
+    assert manager.refresh()
+    assert list(manager.snapshot().df["X"]) == ["activity 0", "activity 1"]
+
+
+def test_rewritten_file_is_reloaded(tmp_path):
+    path = tmp_path / "pred.csv"
+    path.write_text(HEADER + _row(0) + _row(1), encoding="utf-8")
+    manager = DatasetManager(str(tmp_path), converters=CONVERTERS)
+
+    path.write_text(HEADER + _row(7) + _row(8) + _row(9), encoding="utf-8")
+    assert manager.refresh()
+    assert list(manager.snapshot().df["X"]) == ["activity 7", "activity 8", "activity 9"]
+
+
+def test_files_without_prediction_columns_are_ignored(tmp_path):
+    (tmp_path / "pred.csv").write_text(HEADER + _row(0), encoding="utf-8")
+    (tmp_path / "other.csv").write_text("a,b\n1,2\n", encoding="utf-8")
+    manager = DatasetManager(str(tmp_path), converters=CONVERTERS)
+    assert list(manager.snapshot().df["X"]) == ["activity 0"]
+
+
+def test_same_size_rewrite_of_earlier_rows_is_reloaded(tmp_path):
+    path = tmp_path / "pred.csv"
+    path.write_text(HEADER + _row(0) + _row(1) + _row(2), encoding="utf-8")
+    manager = DatasetManager(str(tmp_path), converters=CONVERTERS)
+
+    # same size and same last bytes, only the first row changed
+    path.write_text(HEADER + _row(5) + _row(1) + _row(2), encoding="utf-8")
+    assert manager.refresh()
+    assert list(manager.snapshot().df["X"]) == ["activity 5", "activity 1", "activity 2"]
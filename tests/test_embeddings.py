@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from embeddings import EmbeddingStore, store_path, top_k_candidates
+
+
+def test_store_roundtrip_and_append(tmp_path):
+    path = str(tmp_path / "s")
+    store = EmbeddingStore(path, model="m1")
+    store.add(["a", "b"], np.eye(2, 4))
+    store.add(["b", "c"], np.eye(2, 4)[::-1])  # "b" already stored -> skipped
+    reopened = EmbeddingStore(path, model="m1")
+    assert reopened.keys == ["a", "b", "c"]
+    assert np.allclose(reopened.get(["c"]), np.eye(2, 4)[0])
+
+
+def test_store_rejects_other_model(tmp_path):
+    path = str(tmp_path / "s")
+    EmbeddingStore(path, model="m1").add(["a"], np.ones((1, 4)))
+    with pytest.raises(ValueError):
+        EmbeddingStore(path, model="m2")
+
+
+def test_store_path_per_model(tmp_path):
+    assert store_path("skills", "org/model-a", str(tmp_path)) != store_path("skills", "org/model-b", str(tmp_path))
+
+
+def test_top_k_candidates_order():
+    skills = np.eye(3)
+    acts = np.array([[0.1, 0.9, 0.3]])
+    assert top_k_candidates(acts, skills, 2).tolist() == [[1, 2]]
+
+
+def test_int8_recall_close_to_float16(tmp_path):
+    rng = np.random.default_rng(0)
+    base = rng.standard_normal((2000, 768)).astype(np.float32)
+    queries = base[:50] + 0.3 * rng.standard_normal((50, 768)).astype(np.float32)
+    keys = [str(i) for i in range(len(base))]
+    recall = {}
+    for dtype in ("float16", "int8"):
+        store = EmbeddingStore(str(tmp_path / dtype), dtype=dtype)
+        store.add(keys, base)
+        store = EmbeddingStore(str(tmp_path / dtype))  # reopen: scales come from disk
+        exact = top_k_candidates(queries / np.linalg.norm(queries, axis=1, keepdims=True),
+                                 base / np.linalg.norm(base, axis=1, keepdims=True), 5)
+        approx = top_k_candidates(queries / np.linalg.norm(queries, axis=1, keepdims=True), store.take(slice(0, None)), 5)
+        recall[dtype] = np.mean([len(set(a) & set(e)) / 5 for a, e in zip(approx, exact)])
+    assert recall["int8"] >= 0.98 and recall["int8"] >= recall["float16"] - 0.02
+
+
+def test_import_does_not_build_the_llm_client():
+    code = "import sys, embeddings, similarity; print('functions' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert out.stdout.strip() == "False"
@@ -0,0 +1,63 @@
+import json
+import pandas as pd
+from extraction import _build_extraction_prompt, run_extraction
+
+SKILLS = ["a", "b", "c", "d", "e", "f"]
+
+
+class _StubClient:
+    """Answers extraction prompts; fails every batch containing a skill in `fail`."""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.batches = []
+
+    def chat_with_usage(self, messages, temperature=0, max_tokens=0):
+        prompt = messages[-1]["content"]
+        batch = prompt.split("Skills to assess:\n")[1].split("\n\n")[0].split("\n")
+        batch = [line[2:] for line in batch]
+        self.batches.append(batch)
+        if self.fail & set(batch):
+            raise RuntimeError("boom")
+        objs = [{"skill": sk, "needed": sk == "a", "optional": False, "trainable": False,
+                 "reason": "r", "span": None} for sk in batch]
+        return json.dumps(objs), {"prompt_tokens": 1, "completion_tokens": 1}
+
+
+def test_prompt_lists_skills():
+    assert "- a\n- b" in _build_extraction_prompt("text", ["a", "b"])
+
+
+def test_resume_with_other_batch_size(tmp_path):
+    out = str(tmp_path / "out.csv")
+    first = _StubClient(fail={"c"})
+    report = run_extraction(["t1"], out, SKILLS, client=first, batch_size=2, concurrency=1, progress_every=0)
+    assert report["rows"] == 0 and report["failed_rows"] == 1
+    assert (tmp_path / "out.csv.ckpt.jsonl").exists()
+
+    second = _StubClient()
+    report = run_extraction(["t1"], out, SKILLS, client=second, batch_size=4, concurrency=1, progress_every=0)
+    assert report["rows"] == 1
+    # only the skills of the failed batch are assessed again
+    assert sorted(sk for b in second.batches for sk in b) == ["c", "d"]
+    df = pd.read_csv(out)
+    assert len(df) == 1 and not (tmp_path / "out.csv.ckpt.jsonl").exists()
+
+
+def test_checkpoint_kept_while_rows_pending(tmp_path):
+    out = str(tmp_path / "out.csv")
+    run_extraction(["t1", "t2"], out, SKILLS, client=_StubClient(fail={"f"}), batch_size=3,
+                   concurrency=2, progress_every=0)
+    assert (tmp_path / "out.csv.ckpt.jsonl").exists()
+    assert not (tmp_path / "out.csv").exists()
+
+
+def test_resume_with_other_candidates(tmp_path):
+    out = str(tmp_path / "out.csv")
+    run_extraction(["t1"], out, SKILLS, client=_StubClient(fail={"e"}), candidates=[["a", "b", "e"]],
+                   batch_size=1, concurrency=1, progress_every=0)
+    second = _StubClient()
+    report = run_extraction(["t1"], out, SKILLS, client=second, candidates=[["a", "b", "e", "f"]],
+                            batch_size=8, concurrency=1, progress_every=0)
+    assert report["rows"] == 1
+    assert second.batches == [["e", "f"]]
@@ -0,0 +1,114 @@
+import gc
+import threading
+import time
+from jobs import IdleQueue, JobRegistry, ResultStore
+
+
+def _ok(v):
+    return {"score": v, "failed": False}
+
+
+def test_result_is_shared_when_the_job_finishes():
+    store = ResultStore()
+    reg = JobRegistry(max_jobs=64, result_store=store)
+    reg.submit("a", _ok, 0.5).result()
+    reg.submit("b", lambda: {"failed": True}).result()
+    assert store.get("a") == {"score": 0.5, "failed": False}
+    assert store.get("b") is None  # failures are never cached
+    other = JobRegistry(result_store=store)
+    assert other.get("a").result()["score"] == 0.5
+    reg.close()
+    other.close()
+
+
+def test_eviction_cancels_queued_and_keeps_running():
+    gate = threading.Event()
+    reg = JobRegistry(max_jobs=2, result_store=ResultStore())
+    running = reg.submit("run", gate.wait)
+    queued = reg.submit("q1", _ok, 1)
+    reg.submit("q2", _ok, 2)  # over the limit: "run" is running, "q1" gets cancelled
+    assert queued.cancelled()
+    assert reg.get("run") is running
+    assert len(reg) == 2
+    gate.set()
+    reg.close()
+
+
+def test_lru_order_protects_recently_used():
+    reg = JobRegistry(max_jobs=2, result_store=None)
+    reg.submit("a", _ok, 1).result()
+    reg.submit("b", _ok, 2).result()
+    reg.get("a")  # touch
+    reg.submit("c", _ok, 3).result()
+    assert reg.get("b") is None and reg.get("a") is not None
+    reg.close()
+
+
+def test_executor_shut_down_when_session_ends():
+    reg = JobRegistry()
+    reg.submit("a", _ok, 1).result()
+    executor = reg.executor
+    del reg
+    gc.collect()
+    assert executor._shutdown
+
+
+def _wait_for(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not cond() and time.monotonic() < end:
+        time.sleep(0.005)
+    return cond()
+
+
+def test_idle_queue_waits_for_idle_and_runs_newest_first():
+    gate = threading.Event()
+    busy = JobRegistry(result_store=ResultStore())
+    busy.submit("interactive", gate.wait)
+    store = ResultStore()
+    queue = IdleQueue(store, max_pending=2, idle_wait=0.01)
+    order = []
+    for key in ("a", "b", "c"):  # "a" is dropped: over max_pending
+        queue.enqueue(key, lambda k=key: order.append(k) or {"k": k, "failed": False})
+    time.sleep(0.05)
+    assert order == []  # a session job is running
+    gate.set()
+    assert _wait_for(lambda: len(order) == 2)
+    assert order == ["c", "b"]
+    assert store.get("a") is None and store.get("c")["k"] == "c"
+    busy.close()
+
+
+def test_claim_shares_the_running_task():
+    gate, started = threading.Event(), threading.Event()
+    calls = []
+
+    def task():
+        calls.append(1)
+        started.set()
+        gate.wait()
+        return {"expl": "x", "failed": False}
+
+    store = ResultStore()
+    queue = IdleQueue(store, idle_wait=0.01)
+    queue.enqueue("k", task)
+    assert started.wait(2.0)
+    fut = queue.claim("k")
+    assert fut is not None and not fut.done()
+    reg = JobRegistry(result_store=store)
+    assert reg.adopt("k", fut) is reg.get("k")
+    queue.enqueue("k", task)  # already running -> not queued again
+    gate.set()
+    assert fut.result(timeout=2.0)["expl"] == "x"
+    assert len(calls) == 1 and len(queue) == 0
+    reg.close()
+
+
+def test_claim_removes_a_waiting_task():
+    gate = threading.Event()
+    busy = JobRegistry(result_store=ResultStore())
+    busy.submit("interactive", gate.wait)
+    queue = IdleQueue(ResultStore(), idle_wait=0.01)
+    queue.enqueue("k", _ok, 1)
+    assert queue.claim("k") is None and len(queue) == 0
+    gate.set()
+    busy.close()
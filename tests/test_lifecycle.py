@@ -0,0 +1,105 @@
+from openai import APITimeoutError
+
+from lifecycle import READY, UNREACHABLE, WARMING, BackendLifecycle
+
+
+class _Client:
+    def __init__(self, fail=None):
+        self.fail = fail  # exception raised by chat(), None = answers
+        self.calls = 0
+
+    def chat(self, messages, temperature=0.2, max_tokens=2048, timeout=None):
+        self.calls += 1
+        if self.fail is not None:
+            raise self.fail
+        return "ok"
+
+
+class _Endpoint:
+    def __init__(self, client, healthy=True):
+        self.client = client
+        self.healthy = healthy
+
+    def serves(self, model):
+        return True
+
+
+class _Pool:
+    model = "m"
+
+    def __init__(self, *clients):
+        self.endpoints = [_Endpoint(c) for c in clients]
+
+    def list_models(self):
+        return ["m"]
+
+
+def _timeout():
+    err = APITimeoutError.__new__(APITimeoutError)
+    Exception.__init__(err, "timeout")
+    return err
+
+
+def test_pool_warms_up_every_endpoint_and_is_ready_once_one_is_warm():
+    fast, loading = _Client(), _Client(fail=_timeout())
+    life = BackendLifecycle(_Pool(fast, loading), keepalive_interval=0)
+    assert life.check() == READY
+    assert fast.calls == 1 and loading.calls == 1
+    assert "1/2" in life.status_text()
+
+    loading.fail = None  # model finished loading: warmed up on the next check
+    assert life.check() == READY
+    assert loading.calls == 2 and fast.calls == 1
+    assert "2/2" in life.status_text()
+
+
+def test_pool_keeps_warming_while_every_endpoint_times_out():
+    life = BackendLifecycle(_Pool(_Client(fail=_timeout()), _Client(fail=_timeout())))
+    assert life.check() == WARMING
+
+
+def test_keepalive_reaches_every_warm_endpoint():
+    a, b = _Client(), _Client()
+    life = BackendLifecycle(_Pool(a, b), keepalive_interval=1e-9)
+    life.check()
+    life.check()
+    assert a.calls == 2 and b.calls == 2
+
+    a.fail = b.fail = ConnectionError()
+    assert life.check() == UNREACHABLE
+
+
+def test_ejected_endpoint_is_not_kept_alive():
+    a, b = _Client(), _Client()
+    pool = _Pool(a, b)
+    life = BackendLifecycle(pool, keepalive_interval=1e-9)
+    life.check()
+    pool.endpoints[1].healthy = False
+    life.check()
+    assert a.calls == 2 and b.calls == 1
+    assert "1/2" in life.status_text()
+
+
+def test_single_client_is_warmed_up_directly():
+    client = _Client()
+    client.model = "m"
+    client.list_models = lambda: ["m"]
+    life = BackendLifecycle(client, keepalive_interval=0)
+    assert life.check() == READY and client.calls == 1
+    assert "Endpunkte" not in life.status_text()
+
+
+def test_failed_request_only_triggers_a_probe():
+    pool = _Pool(_Client(), _Client())
+    life = BackendLifecycle(pool, keepalive_interval=0)
+    life.check()
+    life.report_failure(ConnectionError())
+    assert life.ready  # still accepting jobs until the probe says otherwise
+    assert life.check() == READY
+
+    def down():
+        raise ConnectionError()
+
+    pool.list_models = down
+    life.report_failure(ConnectionError())
+    assert life.check() == UNREACHABLE
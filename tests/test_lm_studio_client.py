@@ -0,0 +1,66 @@
+import pytest
+from openai import APIConnectionError, APITimeoutError
+from lm_studio_client import LMStudioPool
+
+
+def _api_error(cls):
+    # openai errors require an http request object; the tests only need the type
+    err = cls.__new__(cls)
+    Exception.__init__(err, cls.__name__)
+    return err
+
+
+class _StubClient:
+    def __init__(self, error=None):
+        self.error = error
+
+    def chat_with_usage(self, messages, temperature=0.2, max_tokens=2048, timeout=None):
+        if self.error is not None:
+            raise self.error
+        return "ok", {"prompt_tokens": 1, "completion_tokens": 1}
+
+
+def _pool(n=2, strategy="least_loaded"):
+    pool = LMStudioPool([f"http://ep{i}/v1" for i in range(n)], model="m", strategy=strategy, health_interval=0)
+    for ep in pool.endpoints:
+        ep.client = _StubClient()
+    return pool
+
+
+def test_timeout_does_not_eject():
+    pool = _pool(1)
+    pool.endpoints[0].client = _StubClient(_api_error(APITimeoutError))
+    with pytest.raises(APITimeoutError):
+        pool.chat([])
+    ep = pool.endpoints[0]
+    assert ep.healthy and ep.inflight == 0 and ep.latency is not None
+
+
+def test_connection_error_ejects():
+    pool = _pool(1)
+    pool.endpoints[0].client = _StubClient(_api_error(APIConnectionError))
+    with pytest.raises(APIConnectionError):
+        pool.chat([])
+    assert not pool.endpoints[0].healthy
+
+
+def test_latency_strategy_spreads_load():
+    pool = _pool(2, strategy="latency")
+    fast, slow = pool.endpoints
+    fast.latency, slow.latency = 1.0, 2.5
+    picked = [pool._acquire("m") for _ in range(4)]
+    # fast takes requests until its queue makes it slower than the idle slow node
+    assert [ep is fast for ep in picked] == [True, True, False, True]
+
+
+def test_least_loaded_round_robins():
+    pool = _pool(3)
+    picked = {id(pool._acquire("m")) for _ in range(3)}
+    assert len(picked) == 3
+
+
+def test_embeddings_do_not_affect_chat_routing():
+    pool = _pool(1)
+    pool.endpoints[0].client.embed = lambda texts, model: [[0.0]] * len(texts)
+    pool.embed(["x"], "emb")
+    assert pool.endpoints[0].latency is None
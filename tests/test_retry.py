@@ -0,0 +1,94 @@
+import time
+import pytest
+from openai import APIConnectionError, APITimeoutError, RateLimitError
+import functions
+from lm_studio_client import CircuitBreaker, CircuitOpenError
+
+
+def _api_error(cls):
+    err = cls.__new__(cls)
+    Exception.__init__(err, cls.__name__)
+    return err
+
+
+class _SlowClient:
+    """Times out after the requested timeout, like a stuck server."""
+
+    def __init__(self):
+        self.timeouts = []
+
+    def chat(self, messages, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        time.sleep(min(timeout, 5.0))
+        raise _api_error(APITimeoutError)
+
+
+@pytest.fixture
+def slow_backend(monkeypatch):
+    client = _SlowClient()
+    monkeypatch.setattr(functions, "lm_studio_client", client)
+    monkeypatch.setattr(functions, "llm_breaker", CircuitBreaker(failure_threshold=100))
+    monkeypatch.setattr(functions, "LLM_TIMEOUT", 0.5)
+    monkeypatch.setattr(functions, "LLM_ATTEMPTS", 10)
+    monkeypatch.setattr(functions, "LLM_DEADLINE", 0.8)
+    return client
+
+
+def test_deadline_bounds_all_tries(slow_backend):
+    t0 = time.monotonic()
+    with pytest.raises(APITimeoutError):
+        functions._chat_with_retry([{"role": "user", "content": "x"}])
+    assert time.monotonic() - t0 < 0.8 + 0.2
+    assert all(t <= 0.5 for t in slow_backend.timeouts)
+
+
+def test_breaker_opens_and_half_opens():
+    br = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    br.record_failure()
+    assert br.state == "closed"
+    br.record_failure()
+    assert br.state == "open"
+    with pytest.raises(CircuitOpenError):
+        br.before_call()
+    time.sleep(0.12)
+    assert br.state == "half-open"
+    br.before_call()  # the single trial call
+    with pytest.raises(CircuitOpenError):
+        br.before_call()
+    br.record_failure()  # failed trial -> open again
+    assert br.state == "open"
+    time.sleep(0.12)
+    br.before_call()
+    br.record_success()
+    assert br.state == "closed"
+    br.before_call()
+
+
+class _FailingClient:
+    def __init__(self, error):
+        self.error = error
+
+    def chat(self, messages, **kwargs):
+        raise self.error
+
+
+class _Backend:
+    def __init__(self):
+        self.failures = []
+
+    def report_failure(self, error):
+        self.failures.append(error)
+
+    def touch(self):
+        pass
+
+
+def test_only_connection_failures_reach_the_lifecycle(monkeypatch):
+    backend = _Backend()
+    monkeypatch.setattr(functions, "backend", backend)
+    monkeypatch.setattr(functions, "llm_breaker", CircuitBreaker(failure_threshold=100))
+    for cls in (APITimeoutError, RateLimitError, APIConnectionError):
+        monkeypatch.setattr(functions, "lm_studio_client", _FailingClient(_api_error(cls)))
+        with pytest.raises(cls):
+            functions._chat_once([{"role": "user", "content": "x"}])
+    assert [type(e) for e in backend.failures] == [APIConnectionError]
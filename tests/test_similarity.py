@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+
+from similarity import ActivityIndex
+
+
+class _Embedder:
+    """Deterministic embeddings; fails once `fail_after` texts were embedded."""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.embedded = 0
+
+    def embed(self, texts, model):
+        if self.fail_after is not None and self.embedded + len(texts) > self.fail_after:
+            raise ConnectionError("down")
+        self.embedded += len(texts)
+        return [np.random.default_rng(abs(hash(t)) % 2**32).standard_normal(16) for t in texts]
+
+
+def _wait(index):
+    for _ in range(200):
+        if not index.syncing:
+            return
+        time.sleep(0.01)
+
+
+def test_failed_sync_keeps_saved_batches(tmp_path):
+    texts = [f"activity {i}" for i in range(100)]
+    failing = _Embedder(fail_after=50)
+    index = ActivityIndex(str(tmp_path / "idx"), client=failing, model="m")
+    try:
+        index.sync(texts, batch_size=8, save_every=16)
+    except ConnectionError:
+        pass
+    saved = len(index)
+    assert saved == 48  # three appends of 16 before the failing request
+
+    resumed = _Embedder()
+    index = ActivityIndex(str(tmp_path / "idx"), client=resumed, model="m")
+    assert index.sync(texts) == 100 - saved
+    assert resumed.embedded == 100 - saved
+
+
+def test_start_sync_runs_in_background_and_backs_off(tmp_path):
+    index = ActivityIndex(str(tmp_path / "idx"), client=_Embedder(fail_after=0), model="m")
+    assert index.start_sync([f"a{i}" for i in range(10)], version=1)
+    _wait(index)
+    assert index.sync_error == "ConnectionError"
+    assert not index.start_sync(["a0"], version=1)  # within the backoff
+
+    index.client = _Embedder()
+    index._retry_at = 0.0
+    assert index.start_sync([f"a{i}" for i in range(10)], version=1)
+    _wait(index)
+    assert index.sync_error is None and len(index) == 10
+    assert not index.start_sync(["a0"], version=1)  # version already synced
+    assert index.search(index.vector("a3"), k=1)[0][0][1] > 0.99
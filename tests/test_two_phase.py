@@ -0,0 +1,39 @@
+import json
+
+import functions
+from functions import _build_explanation_prompt, _build_prompt
+
+ARGS = ("Walk dogs of the shelter.", [{"skill": "show empathy", "needed": True}], ["show empathy"],
+        "goal", "interests", 1)
+
+
+def test_score_only_call_is_short(monkeypatch):
+    seen = {}
+
+    def chat(messages, **kwargs):
+        seen.update(kwargs, prompt=messages[0]["content"])
+        return json.dumps({"score": 1.4, "explanation_short": "fits", "recommend": True})
+
+    monkeypatch.setattr(functions, "_chat_with_retry", chat)
+    res = functions._worker(*ARGS, detailed=False)
+    assert res == {"score": 1.0, "expl": None, "expl_short": "fits", "failed": False}
+    assert seen["max_tokens"] == functions.LLM_FAST_MAX_TOKENS
+    assert '"explanation":' not in seen["prompt"]
+
+
+def test_explanation_prompt_shares_the_score_prompt_prefix():
+    score_prompt = _build_prompt(*ARGS, detailed=False)
+    prompt = _build_explanation_prompt(*ARGS, 0.73, "fits")
+    prefix = score_prompt.split("Response (JSON):", 1)[0].rstrip()
+    assert prompt.startswith(prefix)
+    assert "Response (JSON):" not in prompt
+    assert "score of 0.73" in prompt and "fits" in prompt
+
+
+def test_explanation_worker_uses_the_parts_of_a_long_text(monkeypatch):
+    seen = []
+    monkeypatch.setattr(functions, "_chat_with_retry", lambda messages, **kw: seen.append(messages) or " text ")
+    parts = [{"score": 0.5, "expl_short": "first half", "evidence": []}]
+    res = functions._explanation_worker(*ARGS, 0.5, "fits", parts=parts)
+    assert res == {"expl": "text", "failed": False}
+    assert "first half" in seen[0][0]["content"] and ARGS[0] not in seen[0][0]["content"]